@@ -1,19 +1,213 @@
 #!/usr/bin/env python3
+import argparse
+import mmap
+import os
+import stat
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import add_profile_arguments, phase, profile_stage
+
+# Bytes per chunk in the chunked mode; each worker holds about two chunks
+CHUNK_SIZE = 16 * 1024 * 1024
+
+def add_newlines_to_text(content):
+    return content.replace(',', ',\n')
+
+def add_newlines_to_bytes(data):
+    # Bytes-level equivalent of reading in text mode and writing the result
+    # back: line endings are normalised to '\n' the way universal newlines
+    # would. Comma and line-break bytes never occur inside a multi-byte
+    # UTF-8 sequence, so nothing needs decoding.
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    return data.replace(b',', b',\n')
 
 def add_newlines_after_commas(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as infile:
-        content = infile.read()
+    with phase('read'):
+        with open(input_file, 'r', encoding='utf-8') as infile:
+            content = infile.read()
 
-    modified_content = content.replace(',', ',\n')
+    with phase('replace'):
+        modified_content = add_newlines_to_text(content)
 
-    with open(output_file, 'w', encoding='utf-8') as outfile:
-        outfile.write(modified_content)
+    with phase('write'):
+        with open(output_file, 'w', encoding='utf-8') as outfile:
+            outfile.write(modified_content)
 
     print(f"Successfully processed {input_file}")
     print(f"Output saved to {output_file}")
 
+def chunk_end(mapped, start, chunk_size):
+    # End of the chunk that begins at start: just after the first '\n' from
+    # start + chunk_size on. A line longer than another chunk_size (or data
+    # with no newlines at all) is cut just after a ',' instead, and failing
+    # that before the next byte that starts a UTF-8 character and is not the
+    # '\n' of a '\r\n'. So a chunk never splits a character or a '\r\n'
+    # pair and holds at most about 2 * chunk_size bytes.
+    first = start + chunk_size - 1
+    limit = start + 2 * chunk_size
+    end = mapped.find(b'\n', first, limit)
+    if end >= 0:
+        return end + 1
+    if limit >= len(mapped):
+        return len(mapped)
+    end = mapped.find(b',', first, limit)
+    if end >= 0:
+        return end + 1
+    end = limit
+    while end < len(mapped) and (0x80 <= mapped[end] < 0xC0 or mapped[end - 1:end + 1] == b'\r\n'):
+        end += 1
+    return end
+
+def chunk_bounds(mapped, chunk_size=CHUNK_SIZE):
+    # (start, end) byte ranges of about chunk_size, split as chunk_end says
+    bounds = []
+    start = 0
+    while start < len(mapped):
+        end = chunk_end(mapped, start, chunk_size)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def transform_chunk(input_file, start, end):
+    # Worker: map the input itself (a mapping cannot be sent between
+    # processes) and transform one range of it
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return add_newlines_to_bytes(mapped[start:end])
+
+def add_newlines_mapped(input_file, out, jobs=1, chunk_size=CHUNK_SIZE):
+    # Split the memory-mapped input into chunks, transform them on a process
+    # pool and write them to out in order. Only a few chunks per worker are
+    # in flight at a time, so memory stays bounded whatever the file size.
+    with open(input_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            bounds = chunk_bounds(mapped, chunk_size)
+
+            if jobs <= 1 or len(bounds) == 1:
+                for start, end in bounds:
+                    with phase('transform'):
+                        data = add_newlines_to_bytes(mapped[start:end])
+                    with phase('write'):
+                        out.write(data)
+                return len(bounds)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for start, end in bounds:
+            pending.append(pool.submit(transform_chunk, input_file, start, end))
+            if len(pending) >= 2 * jobs:
+                with phase('transform'):
+                    data = pending.popleft().result()
+                with phase('write'):
+                    out.write(data)
+        while pending:
+            with phase('transform'):
+                data = pending.popleft().result()
+            with phase('write'):
+                out.write(data)
+    return len(bounds)
+
+def add_newlines_streaming(infile, out, chunk_size=CHUNK_SIZE):
+    # Fallback for pipes, which cannot be mapped: transform fixed-size reads
+    # in order. A '\r' at the end of a read waits for the next one in case it
+    # is the first half of '\r\n'.
+    chunks = 0
+    carry = b''
+    while True:
+        with phase('read'):
+            data = infile.read(chunk_size)
+        if not data:
+            break
+        data = carry + data
+        carry = b''
+        if data.endswith(b'\r'):
+            data, carry = data[:-1], b'\r'
+        with phase('transform'):
+            data = add_newlines_to_bytes(data)
+        with phase('write'):
+            out.write(data)
+        chunks += 1
+    if carry:
+        out.write(add_newlines_to_bytes(carry))
+    return chunks
+
+def is_regular_file(path):
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+def add_newlines_after_commas_chunked(input_file, output_file, jobs=1, chunk_size=CHUNK_SIZE):
+    # Bytes-level mode for multi-GB inputs. Regular files are memory-mapped
+    # and transformed in parallel; '-' (stdin/stdout), pipes and other
+    # unmappable inputs are streamed. Gives the same output as
+    # add_newlines_after_commas.
+    report = sys.stderr if output_file == '-' else sys.stdout
+
+    if output_file == '-':
+        out = sys.stdout.buffer
+        temp_file = None
+    else:
+        # Through a temporary file, so the output may even replace the input
+        temp_file = output_file + '.tmp'
+        out = open(temp_file, 'wb', buffering=1 << 20)
+
+    try:
+        if input_file != '-' and is_regular_file(input_file):
+            chunks = add_newlines_mapped(input_file, out, jobs, chunk_size)
+            mode = f"{jobs} worker(s), memory-mapped"
+        elif input_file == '-':
+            chunks = add_newlines_streaming(sys.stdin.buffer, out, chunk_size)
+            mode = "streamed"
+        else:
+            with open(input_file, 'rb') as infile:
+                chunks = add_newlines_streaming(infile, out, chunk_size)
+            mode = "streamed"
+    except BaseException:
+        # Leave no half-written output behind, e.g. when a worker fails
+        if temp_file:
+            out.close()
+            os.remove(temp_file)
+        raise
+    finally:
+        if temp_file:
+            out.close()
+        else:
+            out.flush()
+
+    if temp_file:
+        os.replace(temp_file, output_file)
+
+    print(f"Successfully processed {input_file} in {chunks} chunk(s), {mode}", file=report)
+    print(f"Output saved to {output_file}", file=report)
+
+def positive_int(value):
+    # argparse type for sizes; a chunk of 0 bytes would never advance
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
 if __name__ == "__main__":
-    input_filename = "raw_Odyssey.txt"
-    output_filename = "Odyssey_formatted.txt"
+    parser = argparse.ArgumentParser(description="Start a new line after every comma")
+    parser.add_argument('input_file', nargs='?', default="raw_Odyssey.txt", help="'-' for stdin")
+    parser.add_argument('output_file', nargs='?', default="Odyssey_formatted.txt", help="'-' for stdout")
+    parser.add_argument('--chunked', action='store_true',
+                        help="process bytes in chunks with bounded memory (implied by '-')")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes in chunked mode (default: all cores)")
+    parser.add_argument('--chunk-size', type=positive_int, default=CHUNK_SIZE, help="bytes per chunk in chunked mode")
+    add_profile_arguments(parser, 'commas')
+    args = parser.parse_args()
 
-    add_newlines_after_commas(input_filename, output_filename)
\ No newline at end of file
+    chunked = args.chunked or '-' in (args.input_file, args.output_file)
+    with profile_stage('commas', args.profile, args.cprofile,
+                       inputs=[args.input_file], outputs=[args.output_file]):
+        if chunked:
+            add_newlines_after_commas_chunked(args.input_file, args.output_file, args.jobs, args.chunk_size)
+        else:
+            add_newlines_after_commas(args.input_file, args.output_file)
@@ -1,166 +1,665 @@
 #!/usr/bin/env python3
+import argparse
+import io
+import os
 import re
 import json
-from collections import Counter
-
-def analyze_odyssey_text(input_file):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        text = f.read()
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import keyness_stats
+import length_stats
+import ngram_stats
+from instrumentation import add_profile_arguments, peak_memory_mb, phase, profile_stage
+
+# Bump whenever a change to the analysis alters its output, so cached
+# statistics (see stats_cache.py) are recomputed
+ANALYZER_VERSION = 12
+
+BOOK_HEADER_PATTERN = re.compile(r'^BOOK ([IVXLCDM]+)$')
+SUBTITLE_PATTERN = re.compile(r'^[A-Z\s—]+$')
+FOOTNOTE_START_PATTERN = re.compile(r'^\[\d+\]')
+WORD_PATTERN = re.compile(r'\b[a-zA-Z]+\b')
+SENTENCE_END_PATTERN = re.compile(r'[.!?]+')
+INLINE_FOOTNOTE_PATTERN = re.compile(r'\.(\d+)\s')
+
+# Stop words list (common English words)
+STOP_WORDS = {
+    'the', 'and', 'to', 'of', 'a', 'in', 'that', 'have', 'i', 'it', 'for',
+    'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at', 'this', 'but',
+    'his', 'by', 'from', 'they', 'she', 'or', 'an', 'will', 'my', 'one',
+    'all', 'would', 'there', 'their', 'what', 'so', 'up', 'out', 'if',
+    'about', 'who', 'get', 'which', 'go', 'me', 'when', 'make', 'can',
+    'like', 'time', 'no', 'just', 'him', 'know', 'take', 'people', 'into',
+    'year', 'your', 'good', 'some', 'could', 'them', 'see', 'other',
+    'than', 'then', 'now', 'look', 'only', 'come', 'its', 'over', 'think',
+    'also', 'back', 'after', 'use', 'two', 'how', 'our', 'work', 'first',
+    'well', 'way', 'even', 'new', 'want', 'because', 'any', 'these',
+    'give', 'day', 'most', 'us', 'is', 'was', 'are', 'been', 'has',
+    'had', 'were', 'said', 'each', 'which', 'their', 'said', 'did',
+    'get', 'may', 'find', 'use', 'her', 'than', 'call', 'who', 'oil',
+    'sit', 'now', 'find', 'long', 'down', 'day', 'did', 'get', 'come',
+    'made', 'may', 'part'
+}
+
+# Place names analysis (geographical locations in the Odyssey).
+# Each entry maps the reported name to every surface form counted for it;
+# multi-word forms are matched as token sequences.
+PLACE_NAMES = {
+    'ithaca': ('ithaca',), 'troy': ('troy',), 'sparta': ('sparta',),
+    'pylos': ('pylos',), 'scheria': ('scheria',), 'phaeacia': ('phaeacia',),
+    'crete': ('crete',), 'egypt': ('egypt',), 'cyprus': ('cyprus',),
+    'athens': ('athens',), 'argos': ('argos',), 'mycenae': ('mycenae',),
+    'tiryns': ('tiryns',), 'corinth': ('corinth',), 'sicily': ('sicily',),
+    'italy': ('italy',), 'phoenicia': ('phoenicia',), 'libya': ('libya',),
+    'ethiopia': ('ethiopia',), 'thrace': ('thrace',), 'lemnos': ('lemnos',),
+    'lesbos': ('lesbos',), 'tenedos': ('tenedos',), 'scyros': ('scyros',),
+    'euboea': ('euboea',), 'aegina': ('aegina',), 'salamis': ('salamis',),
+    'megara': ('megara',), 'thebes': ('thebes',), 'delphi': ('delphi',),
+    'olympus': ('olympus', 'mount olympus'), 'parnassus': ('parnassus',),
+    'helicon': ('helicon',), 'cithaeron': ('cithaeron',),
+    'pentelicus': ('pentelicus',), 'hymettus': ('hymettus',),
+    'laurium': ('laurium',), 'sunium': ('sunium',), 'marathon': ('marathon',),
+    'rhamnus': ('rhamnus',), 'decelea': ('decelea',), 'aphidna': ('aphidna',),
+    'acharnae': ('acharnae',), 'colonus': ('colonus',),
+    'aegaleus': ('aegaleus',), 'piraeus': ('piraeus',),
+    'phaleron': ('phaleron',), 'eleusis': ('eleusis',),
+    'dulichium': ('dulichium',), 'same': ('same',),
+    'zacynthus': ('zacynthus',), 'cephalonia': ('cephalonia',),
+    'leucas': ('leucas',), 'ogygian': ('ogygian',), 'aeaea': ('aeaea',),
+    'laestrygonian': ('laestrygonian',), 'cicones': ('cicones',),
+    'lotus': ('lotus',), 'cyclopes': ('cyclopes',), 'hades': ('hades',),
+    'elysium': ('elysium',), 'tartarus': ('tartarus',), 'styx': ('styx',),
+    'lethe': ('lethe',), 'acheron': ('acheron',), 'cocytus': ('cocytus',),
+    'phlegethon': ('phlegethon',), 'oceanus': ('oceanus',),
+    'temesa': ('temesa',), 'ephyra': ('ephyra',),
+}
+
+# Character names analysis (common Greek/epic names). Butler uses the Latin
+# names, so the Greek equivalents are folded into the same count.
+CHARACTER_NAMES = {
+    'ulysses': ('ulysses', 'odysseus'), 'penelope': ('penelope',),
+    'telemachus': ('telemachus',), 'minerva': ('minerva', 'athena'),
+    'jove': ('jove', 'jupiter', 'zeus'), 'neptune': ('neptune', 'poseidon'),
+    'apollo': ('apollo',), 'mercury': ('mercury', 'hermes'),
+    'venus': ('venus', 'aphrodite'), 'mars': ('mars', 'ares'),
+    'diana': ('diana', 'artemis'), 'antinous': ('antinous',),
+    'eurymachus': ('eurymachus',), 'amphinomus': ('amphinomus',),
+    'ctesippus': ('ctesippus',), 'eurycleia': ('eurycleia',),
+    'eumaeus': ('eumaeus',), 'philoetius': ('philoetius',),
+    'melanthius': ('melanthius',), 'melantho': ('melantho',),
+    'laertes': ('laertes',), 'anticlea': ('anticlea',), 'nestor': ('nestor',),
+    'menelaus': ('menelaus',), 'agamemnon': ('agamemnon',),
+    'helen': ('helen',), 'cassandra': ('cassandra',), 'circe': ('circe',),
+    'calypso': ('calypso',), 'nausicaa': ('nausicaa',),
+    'alcinous': ('alcinous',), 'arete': ('arete',),
+    'demodocus': ('demodocus',),
+}
+
+ENTITY_GROUPS = {
+    'places': PLACE_NAMES,
+    'characters': CHARACTER_NAMES,
+}
+
+# Mention timelines count each name in this many equal runs of words
+TIMELINE_BUCKETS = 48
+
+def new_segment_count():
+    # Counts non-empty stretches of text between delimiters. The open stretch
+    # before the first delimiter ('head') and after the last one ('tail') are
+    # kept apart from the completed ones so partial counts can be merged.
+    return {'split': False, 'head': False, 'closed': 0, 'tail': False}
+
+def add_segment_content(segments):
+    if segments['split']:
+        segments['tail'] = True
+    else:
+        segments['head'] = True
+
+def add_segment_delimiter(segments):
+    if segments['split']:
+        segments['closed'] += segments['tail']
+        segments['tail'] = False
+    else:
+        segments['split'] = True
+
+def total_segments(segments):
+    return segments['head'] + segments['closed'] + segments['tail']
+
+def merge_segment_counts(first, second):
+    # Combine the counts of two adjacent stretches of text; an open stretch at
+    # the end of the first continues into the head of the second
+    if not first['split']:
+        merged = dict(second)
+        merged['head'] = first['head'] or second['head']
+        return merged
+    if not second['split']:
+        merged = dict(first)
+        merged['tail'] = first['tail'] or second['head']
+        return merged
+    return {
+        'split': True,
+        'head': first['head'],
+        'closed': first['closed'] + second['closed'] + (first['tail'] or second['head']),
+        'tail': second['tail'],
+    }
 
-    # Remove book headers and chapter subtitles for word analysis
-    text_for_analysis = re.sub(r'^BOOK [IVXLCDM]+$', '', text, flags=re.MULTILINE)
-    text_for_analysis = re.sub(r'^[A-Z\s—]+$', '', text_for_analysis, flags=re.MULTILINE)
+def new_text_counts():
+    return {
+        'characters': 0,
+        'characters_no_spaces': 0,
+        'books': 0,
+        'sentences': new_segment_count(),
+        'paragraphs': new_segment_count(),
+        'word_freq': Counter(),
+        'word_length_total': 0,
+        'tokens': array('I'),
+        'paragraph_runs': [],
+    }
 
-    # Remove footnote paragraphs (lines starting with [number])
-    # This removes entire footnote content, not just reference markers
-    lines = text_for_analysis.split('\n')
-    filtered_lines = []
+def add_sentence_text(segments, text):
+    # Drop inline footnote reference numbers (like "text.14 more") so they are
+    # not mistaken for sentence content, then split on sentence punctuation
+    pieces = SENTENCE_END_PATTERN.split(INLINE_FOOTNOTE_PATTERN.sub('. ', text))
+    if pieces[0].strip():
+        add_segment_content(segments)
+    for piece in pieces[1:]:
+        add_segment_delimiter(segments)
+        if piece.strip():
+            add_segment_content(segments)
+
+def iter_positioned_words(lines, counts=None, at_start=True, sentence_ends=None):
+    # Yield (book, paragraph, word) for every word the statistics count,
+    # skipping book headers, all-caps subtitles and footnote paragraphs.
+    # Paragraphs are numbered like total_paragraphs: non-empty blocks of text
+    # separated by a blank line, counted from 0.
+    # When a counts dict is given, the line-level statistics (characters,
+    # books, sentences, paragraphs) are accumulated into it on the way through.
+    # When a sentence_ends list is given, the number of words yielded so far
+    # is appended to it at every run of sentence-ending punctuation.
+    book = None
+    paragraph = -1
+    paragraph_has_content = False
     in_footnote = False
+    # The last line kept for sentence counting, held back until we know
+    # whether any kept line follows it (and so whether its newline survives)
+    pending_sentence_line = None
+    ends_with_newline = True
+    word_count = 0
 
     for line in lines:
-        line_stripped = line.strip()
-
-        # Check if this line starts a footnote
-        if re.match(r'^\[\d+\]', line_stripped):
+        body = line.rstrip('\n')
+        ends_with_newline = len(body) != len(line)
+
+        if counts is not None:
+            counts['characters'] += len(line)
+            counts['characters_no_spaces'] += len(''.join(line.split()))
+
+        if not body:
+            # A blank line completes a '\n\n' paragraph break, except on the
+            # very first line of the text where there is no newline before it
+            if not at_start:
+                paragraph_has_content = False
+                if counts is not None:
+                    add_segment_delimiter(counts['paragraphs'])
+        elif body.strip():
+            if not paragraph_has_content:
+                paragraph += 1
+                paragraph_has_content = True
+            if counts is not None:
+                add_segment_content(counts['paragraphs'])
+        at_start = False
+
+        # Book headers and all-caps subtitles are blanked out before the
+        # footnote filter, just like any other empty line
+        header = BOOK_HEADER_PATTERN.match(body)
+        if header:
+            book = header.group(1)
+            if counts is not None:
+                counts['books'] += 1
+            body = ''
+        elif SUBTITLE_PATTERN.match(body):
+            body = ''
+
+        line_stripped = body.strip()
+
+        if FOOTNOTE_START_PATTERN.match(line_stripped):
             in_footnote = True
             continue
 
-        # Check if we're in a footnote and this line ends it
         if in_footnote:
-            # If line ends with ']' and doesn't start a new footnote, end the footnote
-            if line_stripped.endswith(']') and not re.match(r'^\[\d+\]', line_stripped):
+            if line_stripped.endswith(']'):
                 in_footnote = False
             continue
 
-        # If we're not in a footnote, keep the line
-        if not in_footnote:
-            filtered_lines.append(line)
+        if counts is not None:
+            if pending_sentence_line is not None:
+                add_sentence_text(counts['sentences'], pending_sentence_line + '\n')
+            pending_sentence_line = body
 
-    text_for_analysis = '\n'.join(filtered_lines)
+        if sentence_ends is None:
+            for word in WORD_PATTERN.findall(body.lower()):
+                yield book, paragraph, word
+            continue
 
-    # Also remove any remaining inline footnote reference numbers (like "text.14 more")
-    text_for_analysis = re.sub(r'\.(\d+)\s', '. ', text_for_analysis)
+        # Punctuation is never part of a word, so splitting on it first
+        # finds exactly the same words
+        for i, piece in enumerate(SENTENCE_END_PATTERN.split(body.lower())):
+            if i:
+                sentence_ends.append(word_count)
+            for word in WORD_PATTERN.findall(piece):
+                word_count += 1
+                yield book, paragraph, word
+
+    if counts is not None and pending_sentence_line is not None:
+        # A trailing newline leaves one more (empty) line, which is only kept
+        # if it does not fall inside an unterminated footnote
+        if ends_with_newline and not in_footnote:
+            pending_sentence_line += '\n'
+        add_sentence_text(counts['sentences'], pending_sentence_line)
+
+def count_words(positioned_words, counts):
+    # Pass positioned words through while tallying word frequencies. Each
+    # word is also stored as a uint32 token ID into the section's own
+    # vocabulary (the words of word_freq, in order of first occurrence),
+    # with [paragraph, first token] for every paragraph, for the n-grams.
+    word_freq = counts['word_freq']
+    tokens = counts['tokens']
+    paragraph_runs = counts['paragraph_runs']
+    word_ids = {}
+    current_paragraph = None
+    for positioned_word in positioned_words:
+        _, paragraph, word = positioned_word
+        word_freq[word] += 1
+        if paragraph != current_paragraph:
+            paragraph_runs.append([paragraph, len(tokens)])
+            current_paragraph = paragraph
+        tokens.append(word_ids.setdefault(word, len(word_ids)))
+        yield positioned_word
+    counts['word_length_total'] = sum(len(word) * count for word, count in word_freq.items())
+
+def sentence_runs(sentence_ends, word_total):
+    # The sentence lengths of a section in words. A sentence can run on from
+    # the section before and into the next one, so the words before the first
+    # end (head) and after the last (tail) are kept apart from the sentences
+    # closed inside the section, as a Counter of lengths.
+    if not sentence_ends:
+        return {'split': False, 'head': word_total, 'closed': Counter(), 'tail': 0}
+    return {
+        'split': True,
+        'head': sentence_ends[0],
+        'closed': Counter(end - start for start, end in zip(sentence_ends, sentence_ends[1:]) if end > start),
+        'tail': word_total - sentence_ends[-1],
+    }
 
-    # Basic statistics
-    stats = {}
+def collect_text_counts(lines, at_start=True):
+    # Single pass over the lines gathering every raw count the statistics need
+    counts = new_text_counts()
+    sentence_ends = []
+    counts['entities'] = build_entity_index(
+        count_words(iter_positioned_words(lines, counts, at_start, sentence_ends), counts))
+    counts['sentence_runs'] = sentence_runs(sentence_ends, sum(counts['word_freq'].values()))
+    return counts
+
+def merge_text_counts(total, part):
+    # Reduce step: fold the counts of the next section of text into total.
+    # Entity positions in part are local to its section, so they are shifted
+    # by the words and paragraphs that came before it.
+    word_offset = sum(total['word_freq'].values())
+    paragraph_offset = total_segments(total['paragraphs'])
+    last_paragraph = total['paragraphs']['tail' if total['paragraphs']['split'] else 'head']
+    if last_paragraph and part['paragraphs']['head']:
+        # The section opens mid-paragraph, continuing the last one
+        paragraph_offset -= 1
+
+    total['characters'] += part['characters']
+    total['characters_no_spaces'] += part['characters_no_spaces']
+    total['books'] += part['books']
+    total['sentences'] = merge_segment_counts(total['sentences'], part['sentences'])
+    total['paragraphs'] = merge_segment_counts(total['paragraphs'], part['paragraphs'])
+    total['word_freq'].update(part['word_freq'])
+    total['word_length_total'] += part['word_length_total']
+
+    if ngram_stats.np is not None:
+        # The section's token IDs are renumbered into the vocabulary of the
+        # whole text, which lists the words in order of first occurrence
+        vocabulary_ids = total.setdefault('vocabulary_ids', {})
+        for word in part['word_freq']:
+            vocabulary_ids.setdefault(word, len(vocabulary_ids))
+        ngram_stats.add_section_ngrams(
+            total.setdefault('ngrams', ngram_stats.new_ngram_totals()),
+            [vocabulary_ids[word] for word in part['word_freq']], part['tokens'], part['paragraph_runs'],
+            paragraph_offset, len(vocabulary_ids))
+
+    entities = total.setdefault('entities', {})
+    for kind, mentions in part['entities'].items():
+        merged = entities.setdefault(kind, {})
+        for name, positions in mentions.items():
+            merged.setdefault(name, []).extend(
+                (book, paragraph + paragraph_offset, offset + word_offset)
+                for book, paragraph, offset in positions)
+
+    return total
+
+def iter_book_headers(positioned_lines):
+    # Yield (position, label) for each BOOK header that can start a section,
+    # given (line, position) pairs. Footnote state is tracked with the same
+    # rules as iter_positioned_words and a header inside an open footnote is
+    # skipped, so sections can be analyzed independently and still merge to
+    # exactly the sequential result.
+    in_footnote = False
+    for line, position in positioned_lines:
+        body = line.rstrip('\r\n')
 
-    # Character and word counts
-    stats['total_characters'] = len(text)
-    stats['total_characters_no_spaces'] = len(re.sub(r'\s', '', text))
+        header = BOOK_HEADER_PATTERN.match(body)
+        if header and not in_footnote:
+            yield position, header.group(1)
+        if header or SUBTITLE_PATTERN.match(body):
+            body = ''
 
-    # Word analysis
-    words = re.findall(r'\b[a-zA-Z]+\b', text_for_analysis.lower())
-    stats['total_words'] = len(words)
+        line_stripped = body.strip()
+        if FOOTNOTE_START_PATTERN.match(line_stripped):
+            in_footnote = True
+        elif in_footnote and line_stripped.endswith(']'):
+            in_footnote = False
+
+def sections_from_headers(headers, size):
+    # Turn header (position, label) pairs into (label, start, end) sections.
+    # Any text before the first header becomes a section labelled None.
+    sections = []
+    first_start = headers[0][0] if headers else size
+    if first_start > 0 or not headers:
+        sections.append((None, 0, first_start))
+    for i, (start, label) in enumerate(headers):
+        end = headers[i + 1][0] if i + 1 < len(headers) else size
+        sections.append((label, start, end))
+    return sections
+
+def find_book_sections(input_file):
+    # Byte ranges (label, start, end) of each BOOK section of a file
+    size = 0
+
+    def positioned_lines(f):
+        nonlocal size
+        for line in f:
+            yield line.decode('utf-8'), size
+            size += len(line)
+
+    with open(input_file, 'rb') as f:
+        headers = list(iter_book_headers(positioned_lines(f)))
+
+    return sections_from_headers(headers, size)
+
+def analyze_section(input_file, start, end):
+    # Map step: counts for one byte range of the file
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    lines = io.StringIO(data.decode('utf-8'), newline=None)
+    return collect_text_counts(lines, at_start=start == 0)
+
+def compile_entity_patterns(entity_groups):
+    # Map each first token to the (tokens, kind, name) patterns starting with
+    # it, longest first, so matching is one dict lookup per word.
+    patterns = {}
+    for kind, names in entity_groups.items():
+        for name, surface_forms in names.items():
+            for form in surface_forms:
+                tokens = tuple(form.split())
+                patterns.setdefault(tokens[0], []).append((tokens, kind, name))
+
+    for candidates in patterns.values():
+        candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+
+    return patterns
+
+def build_entity_index(positioned_words, entity_groups=ENTITY_GROUPS):
+    # One pass over the words, recording (book, paragraph, token offset) for
+    # every entity mention. Returns {kind: {name: [positions, ...]}} with a
+    # key for every configured name, mentioned or not.
+    patterns = compile_entity_patterns(entity_groups)
+    max_tokens = max((len(c[0]) for cs in patterns.values() for c in cs), default=1)
+
+    index = {kind: {name: [] for name in names} for kind, names in entity_groups.items()}
+    window = deque()
+
+    def match_front():
+        first = window[0]
+        for tokens, kind, name in patterns.get(first[3], ()):
+            if len(tokens) <= len(window) and all(
+                    window[j][3] == tokens[j] for j in range(1, len(tokens))):
+                index[kind][name].append(first[:3])
+                return len(tokens)
+        return 1
+
+    for offset, (book, paragraph, word) in enumerate(positioned_words):
+        window.append((book, paragraph, offset, word))
+        if len(window) >= max_tokens:
+            if window[0][3] in patterns:
+                for _ in range(match_front()):
+                    window.popleft()
+            else:
+                window.popleft()
+
+    while window:
+        for _ in range(match_front()):
+            window.popleft()
+
+    return index
+
+def entity_counts(mentions):
+    return {name: len(positions) for name, positions in mentions.items() if positions}
+
+def summarize_text_counts(counts):
+    stats = {}
 
-    # Unique words
-    unique_words = set(words)
-    stats['unique_words'] = len(unique_words)
+    # Character and word counts
+    stats['total_characters'] = counts['characters']
+    stats['total_characters_no_spaces'] = counts['characters_no_spaces']
 
-    # Average word length
-    stats['avg_word_length'] = sum(len(word) for word in words) / len(words) if words else 0
+    word_freq = counts['word_freq']
+    total_words = sum(word_freq.values())
+    stats['total_words'] = total_words
+    stats['unique_words'] = len(word_freq)
+    stats['avg_word_length'] = counts['word_length_total'] / total_words if total_words else 0
 
     # Sentences (rough estimate)
-    sentences = re.split(r'[.!?]+', text_for_analysis)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    stats['total_sentences'] = len(sentences)
-
-    # Average words per sentence
-    stats['avg_words_per_sentence'] = len(words) / len(sentences) if sentences else 0
-
-    # Paragraphs
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    stats['total_paragraphs'] = len(paragraphs)
-
-    # Books count
-    book_matches = re.findall(r'^BOOK [IVXLCDM]+$', text, flags=re.MULTILINE)
-    stats['total_books'] = len(book_matches)
-
-    # Stop words list (common English words)
-    stop_words = {
-        'the', 'and', 'to', 'of', 'a', 'in', 'that', 'have', 'i', 'it', 'for',
-        'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at', 'this', 'but',
-        'his', 'by', 'from', 'they', 'she', 'or', 'an', 'will', 'my', 'one',
-        'all', 'would', 'there', 'their', 'what', 'so', 'up', 'out', 'if',
-        'about', 'who', 'get', 'which', 'go', 'me', 'when', 'make', 'can',
-        'like', 'time', 'no', 'just', 'him', 'know', 'take', 'people', 'into',
-        'year', 'your', 'good', 'some', 'could', 'them', 'see', 'other',
-        'than', 'then', 'now', 'look', 'only', 'come', 'its', 'over', 'think',
-        'also', 'back', 'after', 'use', 'two', 'how', 'our', 'work', 'first',
-        'well', 'way', 'even', 'new', 'want', 'because', 'any', 'these',
-        'give', 'day', 'most', 'us', 'is', 'was', 'are', 'been', 'has',
-        'had', 'were', 'said', 'each', 'which', 'their', 'said', 'did',
-        'get', 'may', 'find', 'use', 'her', 'than', 'call', 'who', 'oil',
-        'sit', 'now', 'find', 'long', 'down', 'day', 'did', 'get', 'come',
-        'made', 'may', 'part'
-    }
+    total_sentences = total_segments(counts['sentences'])
+    stats['total_sentences'] = total_sentences
+    stats['avg_words_per_sentence'] = total_words / total_sentences if total_sentences else 0
 
-    # Word frequency analysis
-    word_freq = Counter(words)
+    stats['total_paragraphs'] = total_segments(counts['paragraphs'])
+    stats['total_books'] = counts['books']
 
     # Most common words (excluding stop words)
-    non_stop_words = [word for word in words if word not in stop_words]
-    non_stop_freq = Counter(non_stop_words)
+    non_stop_freq = Counter({word: count for word, count in word_freq.items() if word not in STOP_WORDS})
     stats['most_common_words'] = non_stop_freq.most_common(50)
 
     # Most common stop words (for reference)
-    stop_word_freq = {word: count for word, count in word_freq.items() if word in stop_words}
+    stop_word_freq = {word: count for word, count in word_freq.items() if word in STOP_WORDS}
     stats['most_common_stop_words'] = sorted(stop_word_freq.items(), key=lambda x: x[1], reverse=True)[:20]
 
-    # Place names analysis (geographical locations in the Odyssey)
-    place_names = {
-        'ithaca', 'troy', 'sparta', 'pylos', 'scheria', 'phaeacia', 'crete',
-        'egypt', 'cyprus', 'athens', 'argos', 'mycenae', 'tiryns', 'corinth',
-        'sicily', 'italy', 'phoenicia', 'libya', 'ethiopia', 'thrace',
-        'lemnos', 'lesbos', 'tenedos', 'scyros', 'euboea', 'aegina',
-        'salamis', 'megara', 'thebes', 'delphi', 'olympus', 'parnassus',
-        'helicon', 'cithaeron', 'pentelicus', 'hymettus', 'laurium',
-        'sunium', 'marathon', 'rhamnus', 'decelea', 'aphidna', 'acharnae',
-        'colonus', 'aegaleus', 'piraeus', 'phaleron', 'eleusis',
-        'dulichium', 'same', 'zacynthus', 'cephalonia', 'leucas',
-        'ogygian', 'aeaea', 'laestrygonian', 'cicones', 'lotus',
-        'cyclopes', 'hades', 'elysium', 'tartarus', 'styx', 'lethe',
-        'acheron', 'cocytus', 'phlegethon', 'oceanus', 'temesa', 'ephyra'
-    }
+    place_freq = entity_counts(counts['entities']['places'])
+    stats['place_mentions'] = sorted(place_freq.items(), key=lambda x: x[1], reverse=True)[:25]
 
-    # Character names analysis (common Greek/epic names)
-    character_names = {
-        'ulysses', 'odysseus', 'penelope', 'telemachus', 'minerva', 'athena',
-        'jupiter', 'jove', 'zeus', 'neptune', 'poseidon', 'apollo', 'mercury',
-        'hermes', 'venus', 'aphrodite', 'mars', 'ares', 'diana', 'artemis',
-        'antinous', 'eurymachus', 'amphinomus', 'ctesippus', 'eurycleia',
-        'eumaeus', 'philoetius', 'melanthius', 'melantho', 'laertes',
-        'anticlea', 'nestor', 'menelaus', 'agamemnon', 'helen', 'cassandra',
-        'circe', 'calypso', 'nausicaa', 'alcinous', 'arete', 'demodocus'
-    }
+    character_freq = entity_counts(counts['entities']['characters'])
+    stats['character_mentions'] = sorted(character_freq.items(), key=lambda x: x[1], reverse=True)[:20]
 
-    # Count place mentions
-    place_freq = {}
-    for place in place_names:
-        count = sum(1 for word in words if word == place)
-        if count > 0:
-            place_freq[place] = count
+    # Longest words
+    stats['longest_words'] = sorted(word_freq, key=len, reverse=True)[:20]
 
-    stats['place_mentions'] = sorted(place_freq.items(), key=lambda x: x[1], reverse=True)[:25]
+    return stats
 
-    # Count character mentions
-    character_freq = {}
-    for name in character_names:
-        count = sum(1 for word in words if word == name)
-        if count > 0:
-            character_freq[name] = count
+def mention_timeline(entities, books, total_words, buckets=TIMELINE_BUCKETS):
+    # Where in the text each mentioned name occurs: its count in every book
+    # (in the order of books) and in each of `buckets` equal runs of counted
+    # words. Paragraphs would not do: the footnotes after the last book are
+    # paragraphs without counted words, which would leave the last buckets
+    # empty. One pass over the mention positions; only the counts are kept,
+    # never the positions themselves.
+    book_numbers = {book: i for i, book in enumerate(books)}
+    buckets = max(min(buckets, total_words), 1)
+    timeline = {'books': books, 'buckets': buckets}
+
+    for kind, mentions in entities.items():
+        names = {}
+        for name, positions in sorted(mentions.items(), key=lambda item: len(item[1]), reverse=True):
+            if not positions:
+                continue
+            per_book = [0] * len(books)
+            per_bucket = [0] * buckets
+            for book, _, offset in positions:
+                if book in book_numbers:
+                    per_book[book_numbers[book]] += 1
+                per_bucket[min(offset * buckets // max(total_words, 1), buckets - 1)] += 1
+            names[name] = {'per_book': per_book, 'per_bucket': per_bucket}
+        timeline[kind] = names
+
+    return timeline
+
+def summarize_book_counts(counts):
+    word_freq = counts['word_freq']
+    non_stop_freq = Counter({word: count for word, count in word_freq.items() if word not in STOP_WORDS})
+    place_freq = entity_counts(counts['entities']['places'])
+    character_freq = entity_counts(counts['entities']['characters'])
+
+    return {
+        'total_words': sum(word_freq.values()),
+        'unique_words': len(word_freq),
+        'most_common_words': non_stop_freq.most_common(10),
+        'place_mentions': sorted(place_freq.items(), key=lambda x: x[1], reverse=True),
+        'character_mentions': sorted(character_freq.items(), key=lambda x: x[1], reverse=True),
+    }
 
-    stats['character_mentions'] = sorted(character_freq.items(), key=lambda x: x[1], reverse=True)[:20]
+def analyze_sections(input_file, sections, jobs=1):
+    # Map step over the given (label, start, end) sections, on a process pool
+    # when jobs > 1. Yields the raw counts for each section, in order. Only a
+    # few sections per worker are in flight at a time, so each result can be
+    # merged and dropped before the rest of the text is counted.
+    if jobs > 1 and len(sections) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending = deque()
+            for _, start, end in sections:
+                pending.append(pool.submit(analyze_section, input_file, start, end))
+                if len(pending) >= 2 * jobs:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        return
+
+    for _, start, end in sections:
+        yield analyze_section(input_file, start, end)
+
+def new_book_counts():
+    # Running per-book counts for the token statistics: word and sentence
+    # length histograms, the word frequencies of every book (only needed
+    # with NumPy) and the sentence left open by the sections so far
+    return {'word_lengths': {}, 'sentence_lengths': {}, 'word_freqs': {}, 'open_sentence': [None, 0]}
+
+def add_sentence_length(books, label, length):
+    books['sentence_lengths'].setdefault(label, Counter())[length] += 1
+
+def add_book_counts(books, label, counts):
+    # Fold one section into the per-book counts. A sentence belongs to the
+    # book of its first word, so the run left open by one section is only
+    # counted once a later one closes it (or the text ends).
+    histogram = books['word_lengths'].setdefault(label, Counter())
+    for word, count in counts['word_freq'].items():
+        histogram[len(word)] += count
+    if label is not None and ngram_stats.np is not None:
+        books['word_freqs'].setdefault(label, Counter()).update(counts['word_freq'])
+
+    runs = counts['sentence_runs']
+    open_sentence = books['open_sentence']
+    if runs['head'] and not open_sentence[1]:
+        open_sentence[0] = label
+    open_sentence[1] += runs['head']
+    if runs['split']:
+        if open_sentence[1]:
+            add_sentence_length(books, *open_sentence)
+        books['sentence_lengths'].setdefault(label, Counter()).update(runs['closed'])
+        books['open_sentence'] = [label, runs['tail']]
+
+def reduce_section_counts(sections, section_counts):
+    # Reduce step: merge the section counts in order into the whole-poem
+    # statistics, with a per_book summary for every labelled section.
+    # section_counts may be a generator: each section is merged as it
+    # arrives and not kept afterwards.
+    total = new_text_counts()
+    books = new_book_counts()
+    per_book = {}
+    for (label, _, _), counts in zip(sections, section_counts):
+        if label is not None:
+            per_book[label] = summarize_book_counts(counts)
+        add_book_counts(books, label, counts)
+        merge_text_counts(total, counts)
+    if books['open_sentence'][1]:
+        add_sentence_length(books, *books['open_sentence'])
+
+    stats = summarize_text_counts(total)
+    stats['per_book'] = per_book
+    stats['mention_timeline'] = mention_timeline(total['entities'], list(per_book), stats['total_words'])
+    return add_token_stats(stats, reduce_token_stats(total, books))
+
+def reduce_token_stats(total, books):
+    # Statistics computed with NumPy from the merged per-section counts:
+    # n-grams, collocations, word/sentence length distributions and each
+    # book's distinctive terms. They are left out without NumPy.
+    if ngram_stats.np is None:
+        return {}
+    vocabulary = list(total['word_freq'])
+    book_names = [label for label in books['word_lengths'] if label is not None]
+
+    with phase('ngrams'):
+        stats = ngram_stats.ngram_statistics_from_totals(
+            total.get('ngrams', ngram_stats.new_ngram_totals()), vocabulary, STOP_WORDS)
+    with phase('lengths'):
+        stats.update(length_stats.length_statistics(books['word_lengths'], books['sentence_lengths'], book_names))
+    with phase('keyness'):
+        stats.update(keyness_stats.book_keyness(books['word_freqs'], vocabulary, STOP_WORDS))
+    return stats
 
-    # Longest words
-    stats['longest_words'] = sorted(set(words), key=len, reverse=True)[:20]
+# Book-level token statistics, merged into the existing per_book summaries
+PER_BOOK_TOKEN_STATS = ('per_book_lengths', 'per_book_distinctive_terms')
 
+def add_token_stats(stats, token_stats):
+    per_book = [token_stats.pop(key, {}) for key in PER_BOOK_TOKEN_STATS]
+    stats.update(token_stats)
+    for book_stats in per_book:
+        for book, values in book_stats.items():
+            if book in stats['per_book']:
+                stats['per_book'][book].update(values)
     return stats
 
-def save_stats_to_json(stats, output_file):
+def analyze_odyssey_lines(lines):
+    # In-memory variant of analyze_odyssey_text for a list of lines, with the
+    # sections given as line ranges instead of byte ranges
+    headers = list(iter_book_headers((line, i) for i, line in enumerate(lines)))
+    sections = sections_from_headers(headers, len(lines))
+    section_counts = (collect_text_counts(lines[start:end], at_start=start == 0)
+                      for _, start, end in sections)
+    return reduce_section_counts(sections, section_counts)
+
+def analyze_odyssey_text(input_file, jobs=1):
+    # Map each BOOK section to its raw counts and reduce them in order into
+    # the whole-poem totals as they arrive. Only the running totals and a
+    # few sections are held in memory, never the text itself.
+    with phase('find_sections'):
+        sections = find_book_sections(input_file)
+    with phase('count_sections'):
+        return reduce_section_counts(sections, analyze_sections(input_file, sections, jobs))
+
+def stats_to_json(stats):
     # Convert to JSON-serializable format
     json_stats = stats.copy()
     json_stats['avg_word_length'] = round(json_stats['avg_word_length'], 2)
     json_stats['avg_words_per_sentence'] = round(json_stats['avg_words_per_sentence'], 2)
+    return json_stats
+
+def save_stats_to_json(stats, output_file):
+    json_stats = stats_to_json(stats)
 
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(json_stats, f, indent=2)
@@ -168,8 +667,27 @@ def save_stats_to_json(stats, output_file):
     return json_stats
 
 if __name__ == "__main__":
-    stats = analyze_odyssey_text("odyssey_formatted.txt")
-    json_stats = save_stats_to_json(stats, "odyssey_stats.json")
+    parser = argparse.ArgumentParser(description="Compute text statistics for the formatted Odyssey")
+    parser.add_argument('input_file', nargs='?', default="odyssey_formatted.txt")
+    parser.add_argument('output_file', nargs='?', default="odyssey_stats.json")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the per-book analysis (default: all cores)")
+    parser.add_argument('--cache-file', default="odyssey_stats.cache.json",
+                        help="content-hash keyed statistics cache shared with create_final_html")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always analyze every book and leave the cache untouched")
+    add_profile_arguments(parser, 'analyze')
+    args = parser.parse_args()
+
+    with profile_stage('analyze', args.profile, args.cprofile,
+                       inputs=[args.input_file], outputs=[args.output_file]):
+        if args.no_cache:
+            stats = analyze_odyssey_text(args.input_file, jobs=args.jobs)
+        else:
+            from stats_cache import load_or_compute_stats
+            stats = load_or_compute_stats(args.input_file, args.cache_file, jobs=args.jobs)
+        with phase('save'):
+            json_stats = save_stats_to_json(stats, args.output_file)
 
     print("Odyssey Text Analysis Complete!")
     print(f"Total words: {stats['total_words']:,}")
@@ -180,9 +698,18 @@ if __name__ == "__main__":
     print(f"Total books: {stats['total_books']}")
     print(f"Average word length: {stats['avg_word_length']:.2f}")
     print(f"Average words per sentence: {stats['avg_words_per_sentence']:.2f}")
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:.1f} MB")
     print("\nTop 10 place mentions:")
     for place, count in stats['place_mentions'][:10]:
         print(f"  {place}: {count}")
     print("\nTop 10 character mentions:")
     for name, count in stats['character_mentions'][:10]:
-        print(f"  {name}: {count}")
\ No newline at end of file
+        print(f"  {name}: {count}")
+    if 'collocations' in stats:
+        print("\nTop 10 collocations (log-likelihood):")
+        for bigram, score, count in stats['collocations']['log_likelihood'][:10]:
+            print(f"  {bigram}: {score:.1f} ({count})")
+    else:
+        print("\nN-gram and collocation statistics skipped: numpy is not installed")
\ No newline at end of file
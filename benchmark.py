@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analyze_odyssey_stats import WORD_PATTERN
+from instrumentation import peak_memory_mb
+
+SOURCE_FILE = 'raw_Odyssey.txt'
+CORPUS_DIR = 'bench_corpora'
+BASELINE_FILE = 'benchmark_baseline.json'
+
+DEFAULT_SCALES = [1, 10, 100]
+
+# Bump when generate_corpus changes, so cached corpora are regenerated
+GENERATOR_VERSION = 1
+
+# A stage is reported as a regression when it is this much slower than the
+# baseline (as a fraction of the baseline time)
+DEFAULT_THRESHOLD = 0.25
+
+BOOKS_PER_ODYSSEY = 24
+LINE_WIDTH = 72
+
+GUTENBERG_HEADER = """The Project Gutenberg eBook of The Synthetic Odyssey
+
+This ebook is for the use of anyone anywhere in the United States and
+most other parts of the world at no cost and with almost no restrictions
+whatsoever.
+
+Title: The Synthetic Odyssey
+
+Author: Homer
+
+Translator: Samuel Butler
+
+Language: English
+
+
+*** START OF THE PROJECT GUTENBERG EBOOK THE SYNTHETIC ODYSSEY ***
+
+
+
+
+[Illustration]
+
+PREFACE
+
+"""
+
+GUTENBERG_FOOTER = """*** END OF THE PROJECT GUTENBERG EBOOK THE SYNTHETIC ODYSSEY ***
+
+
+
+Updated editions will replace the previous one--the old editions will
+be renamed.
+"""
+
+ROMAN_NUMERALS = [
+    (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+    (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I'),
+]
+
+def roman_numeral(number):
+    # Thousands repeat M, which BOOK_HEADER_PATTERN still accepts
+    numeral = ''
+    for value, letters in ROMAN_NUMERALS:
+        count, number = divmod(number, value)
+        numeral += letters * count
+    return numeral
+
+def wrap_words(words, width=LINE_WIDTH):
+    lines = []
+    line = []
+    length = 0
+    for word in words:
+        if line and length + 1 + len(word) > width:
+            lines.append(' '.join(line))
+            line = []
+            length = 0
+        length += len(word) + bool(line)
+        line.append(word)
+    if line:
+        lines.append(' '.join(line))
+    return lines
+
+def make_sentence(rng, vocabulary):
+    words = rng.choices(vocabulary, k=rng.randint(4, 40))
+    words[0] = words[0].capitalize()
+    # Commas give add_newlines_after_commas something to do
+    for _ in range(len(words) // 8):
+        i = rng.randrange(len(words) - 1)
+        words[i] += ','
+    return words
+
+def make_paragraph(rng, vocabulary, footnotes):
+    words = []
+    for _ in range(rng.randint(2, 8)):
+        sentence = make_sentence(rng, vocabulary)
+        ending = rng.choice('...!?')
+        # Now and then an inline footnote reference like "home.14 Then"
+        if rng.random() < 0.05:
+            footnotes.append(len(footnotes) + 1)
+            ending += str(len(footnotes))
+        sentence[-1] += ending
+        words.extend(sentence)
+    return wrap_words(words)
+
+def make_book(rng, vocabulary, number, target_size):
+    # One book: header, all-caps subtitle, paragraphs until target_size
+    # characters, then the bracketed footnotes its paragraphs refer to
+    subtitle = '—'.join(' '.join(rng.choices(vocabulary, k=rng.randint(2, 5))).upper()
+                        for _ in range(rng.randint(2, 4))) + '.'
+    parts = [f"BOOK {roman_numeral(number)}\n\n\n", '\n'.join(wrap_words(subtitle.split())), "\n\n\n"]
+    size = sum(len(part) for part in parts)
+
+    footnotes = []
+    while size < target_size:
+        paragraph = '\n'.join(make_paragraph(rng, vocabulary, footnotes)) + '\n\n'
+        parts.append(paragraph)
+        size += len(paragraph)
+
+    if footnotes:
+        parts.append("FOOTNOTES:\n\n")
+        for footnote in footnotes:
+            text = ' '.join(make_sentence(rng, vocabulary)) + '.'
+            parts.append('\n'.join(wrap_words(f"[{footnote}] [ {text}]".split())) + '\n\n')
+
+    parts.append('\n\n')
+    return ''.join(parts)
+
+def generate_corpus(output_file, scale, source_file=SOURCE_FILE, seed=0):
+    # Write a Gutenberg-style text scale times the size of source_file, with
+    # the same structure the pipeline relies on: START/END markers, BOOK
+    # headers, all-caps subtitles, inline footnote references and bracketed
+    # footnotes. Words are drawn from the source text so their frequencies
+    # and lengths look like the real thing.
+    with open(source_file, 'r', encoding='utf-8') as f:
+        source = f.read()
+    vocabulary = WORD_PATTERN.findall(source.lower())
+    target_size = scale * len(source)
+    book_size = len(source) // BOOKS_PER_ODYSSEY
+
+    rng = random.Random(seed)
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as out:
+        out.write(GUTENBERG_HEADER)
+        size = len(GUTENBERG_HEADER)
+        number = 0
+        while size < target_size:
+            number += 1
+            book = make_book(rng, vocabulary, number, book_size)
+            out.write(book)
+            size += len(book)
+        out.write(GUTENBERG_FOOTER)
+    os.replace(temp_file, output_file)
+    return number
+
+def corpus_file(scale, corpus_dir=CORPUS_DIR):
+    # Generated corpora are kept between runs; the name changes with the
+    # generator so stale ones are never reused
+    os.makedirs(corpus_dir, exist_ok=True)
+    path = os.path.join(corpus_dir, f'raw_{scale}x.v{GENERATOR_VERSION}.txt')
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        books = generate_corpus(path, scale)
+        print(f"Generated {path}: {books:,} books, {os.path.getsize(path) / 1e6:.1f} MB "
+              f"in {time.perf_counter() - start:.1f}s")
+    return path
+
+def stage_files(work_dir, scale):
+    prefix = os.path.join(work_dir, f'{scale}x')
+    return {
+        'clean': f'{prefix}.clean.txt',
+        'formatted': f'{prefix}.formatted.txt',
+        'commas': f'{prefix}.commas.txt',
+        'stats': f'{prefix}.stats.json',
+        'html': f'{prefix}.final.html',
+        'alt_html': f'{prefix}.html',
+    }
+
+def run_extract(raw, files, jobs):
+    from extract_odyssey_only import extract_odyssey_text
+    extract_odyssey_text(raw, files['clean'])
+    return raw
+
+def run_format(raw, files, jobs):
+    from format_odyssey_nicely import format_odyssey_text
+    format_odyssey_text(files['clean'], files['formatted'])
+    return files['clean']
+
+def run_commas(raw, files, jobs):
+    from add_newlines_after_commas import add_newlines_after_commas
+    add_newlines_after_commas(raw, files['commas'])
+    return raw
+
+def run_analyze(raw, files, jobs):
+    from analyze_odyssey_stats import analyze_odyssey_text, save_stats_to_json
+    save_stats_to_json(analyze_odyssey_text(files['formatted'], jobs=jobs), files['stats'])
+    return files['formatted']
+
+def run_final_html(raw, files, jobs):
+    from create_final_html import create_odyssey_html
+    with open(files['stats'], 'r', encoding='utf-8') as f:
+        stats = json.load(f)
+    create_odyssey_html(files['formatted'], files['html'], stats=stats)
+    return files['formatted']
+
+def run_alt_html(raw, files, jobs):
+    from create_odyssey_html import create_html_page
+    create_html_page(files['commas'], files['alt_html'])
+    return files['commas']
+
+# In pipeline order; each stage reads what the ones before it wrote.
+# Each run function returns the file whose size the throughput is based on.
+STAGES = {
+    'extract': run_extract,
+    'format': run_format,
+    'commas': run_commas,
+    'analyze': run_analyze,
+    'final_html': run_final_html,
+    'alt_html': run_alt_html,
+}
+
+def time_stage(name, raw, files, jobs):
+    # Runs in a fresh process so peak RSS belongs to this stage alone
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        input_file = STAGES[name](raw, files, jobs)
+        seconds = time.perf_counter() - start
+
+    peaks = [peak for peak in (peak_memory_mb(), peak_memory_mb(children=True)) if peak is not None]
+    return {
+        'seconds': seconds,
+        'input_mb': os.path.getsize(input_file) / 1e6,
+        'peak_mb': max(peaks) if peaks else None,
+    }
+
+def run_benchmarks(scales, stages=STAGES, jobs=1, work_dir=None):
+    # {scale: {stage: {seconds, input_mb, mb_per_s, peak_mb}}}, keyed by
+    # strings so results and the stored baseline compare directly
+    work_dir = work_dir or os.path.join(CORPUS_DIR, 'work')
+    os.makedirs(work_dir, exist_ok=True)
+    context = multiprocessing.get_context('spawn')
+    results = {}
+
+    for scale in scales:
+        raw = corpus_file(scale)
+        files = stage_files(work_dir, scale)
+        results[str(scale)] = {}
+        # Stages that were not asked for still run when a later one needs
+        # their output, they just are not reported
+        last = max(list(STAGES).index(name) for name in stages)
+        for name in list(STAGES)[:last + 1]:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(time_stage, name, raw, files, jobs).result()
+            if name not in stages:
+                continue
+            result['mb_per_s'] = result['input_mb'] / result['seconds'] if result['seconds'] else None
+            results[str(scale)][name] = result
+            peak = f"{result['peak_mb']:8.1f} MB" if result['peak_mb'] is not None else '       n/a'
+            print(f"  {scale:>5}x {name:<11} {result['seconds']:9.3f}s {result['mb_per_s']:9.2f} MB/s {peak}")
+
+        # Outputs plus what the stages write next to them (.gz, search index)
+        for name in os.listdir(work_dir):
+            if name.startswith(f'{scale}x.'):
+                os.remove(os.path.join(work_dir, name))
+
+    return results
+
+def load_baseline(baseline_file):
+    try:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_baseline(baseline_file, results):
+    # Merge into the existing baseline so scales that were not run this time
+    # keep their numbers
+    baseline = load_baseline(baseline_file) or {}
+    for scale, stages in results.items():
+        baseline.setdefault(scale, {}).update(stages)
+    temp_file = baseline_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(temp_file, baseline_file)
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # Print the change against the baseline for every stage both have;
+    # returns the (scale, stage) pairs that slowed down beyond threshold
+    regressions = []
+    print(f"\n{'scale':>6} {'stage':<11} {'baseline':>10} {'now':>10} {'change':>8}")
+    for scale, stages in results.items():
+        for name, result in stages.items():
+            before = baseline.get(scale, {}).get(name)
+            if not before:
+                continue
+            change = result['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append((scale, name))
+            print(f"{scale + 'x':>6} {name:<11} {before['seconds']:9.3f}s {result['seconds']:9.3f}s {change:+8.1%}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic corpora of increasing size")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help=f"corpus sizes as multiples of {SOURCE_FILE} "
+                             f"(default: {' '.join(map(str, DEFAULT_SCALES))}; 1000 is about 700 MB)")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help="stages to report (earlier stages still run to produce their input)")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="worker processes for the analyze stage")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="record these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown that counts as a regression (default: 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print(f"{'scale':>8} {'stage':<11} {'time':>10} {'throughput':>14} {'peak RSS':>11}")
+    results = run_benchmarks(args.scales, args.stages, jobs=args.jobs)
+
+    regressions = []
+    baseline = load_baseline(args.baseline)
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+    else:
+        print(f"\nNo baseline in {args.baseline}; record one with --save-baseline")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) more than {args.threshold:.0%} slower than the baseline")
+        sys.exit(1)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+
+from extract_odyssey_only import select_odyssey_lines
+from format_odyssey_nicely import format_odyssey_lines
+from add_newlines_after_commas import add_newlines_to_text
+from analyze_odyssey_stats import analyze_odyssey_lines, stats_to_json
+from create_final_html import render_odyssey_html, render_search_index, search_index_file, search_index_url
+from create_odyssey_html import render_html_page
+from instrumentation import add_profile_arguments, phase, profile_stage
+from precompress import compress_files
+
+MANIFEST_FILE = '.build_manifest.json'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Every artifact is text and lives in one file. Sources are only read; every
+# other artifact is produced by exactly one stage in STAGES.
+ARTIFACT_FILES = {
+    'raw': 'raw_Odyssey.txt',
+    'clean': 'odyssey_clean.txt',
+    'formatted': 'odyssey_formatted.txt',
+    'stats': 'odyssey_stats.json',
+    'html': 'odyssey_final.html',
+    'search': search_index_file('odyssey_final.html'),
+    'index': 'index.html',
+    'commas': 'Odyssey_formatted.txt',
+    'alt_html': 'odyssey.html',
+}
+
+SOURCES = {'raw'}
+
+# Intermediates are only written to disk when asked to; downstream stages
+# normally receive them in memory.
+INTERMEDIATES = {'clean', 'formatted', 'commas'}
+
+DEFAULT_TARGETS = ['stats', 'search', 'html', 'index']
+
+# Published pages also get .gz/.br copies for the static server
+COMPRESSED = {'html', 'search', 'index', 'alt_html'}
+
+def run_extract(raw):
+    return ''.join(select_odyssey_lines(io.StringIO(raw)))
+
+def run_format(clean):
+    return format_odyssey_lines(io.StringIO(clean).readlines())
+
+def run_analyze(formatted):
+    stats = analyze_odyssey_lines(io.StringIO(formatted).readlines())
+    return json.dumps(stats_to_json(stats), indent=2)
+
+def run_search_index(formatted):
+    return render_search_index(io.StringIO(formatted).readlines())
+
+def run_final_html(formatted, stats, search):
+    search_url = search_index_url(ARTIFACT_FILES['search'], search)
+    return render_odyssey_html(io.StringIO(formatted).readlines(), json.loads(stats), search_url)
+
+def run_index(html_content):
+    return html_content
+
+def run_alt_html(commas):
+    return render_html_page(io.StringIO(commas).readlines())
+
+# Stage graph, keyed by the artifact each stage produces. 'modules' are the
+# source files whose content decides whether the stage's code changed.
+STAGES = {
+    'clean': {'inputs': ['raw'], 'run': run_extract,
+              'modules': ['extract_odyssey_only.py']},
+    'formatted': {'inputs': ['clean'], 'run': run_format,
+                  'modules': ['format_odyssey_nicely.py']},
+    'stats': {'inputs': ['formatted'], 'run': run_analyze,
+              'modules': ['analyze_odyssey_stats.py', 'ngram_stats.py', 'length_stats.py',
+                          'keyness_stats.py', 'stats_cache.py']},
+    'search': {'inputs': ['formatted'], 'run': run_search_index,
+               'modules': ['create_final_html.py', 'precompress.py']},
+    'html': {'inputs': ['formatted', 'stats', 'search'], 'run': run_final_html,
+             'modules': ['create_final_html.py', 'precompress.py']},
+    'index': {'inputs': ['html'], 'run': run_index,
+              'modules': ['precompress.py']},
+    'commas': {'inputs': ['raw'], 'run': add_newlines_to_text,
+               'modules': ['add_newlines_after_commas.py']},
+    'alt_html': {'inputs': ['commas'], 'run': run_alt_html,
+                 'modules': ['create_odyssey_html.py', 'precompress.py']},
+}
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def code_hash(modules):
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(os.path.join(BASE_DIR, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def read_artifact(name):
+    path = ARTIFACT_FILES[name]
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def write_artifact(name, text):
+    with open(ARTIFACT_FILES[name], 'w', encoding='utf-8') as f:
+        f.write(text)
+    if name in COMPRESSED:
+        compress_files([ARTIFACT_FILES[name]])
+
+def compressed_missing(name):
+    return name in COMPRESSED and not os.path.exists(ARTIFACT_FILES[name] + '.gz')
+
+def load_manifest(manifest_file):
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest_file, manifest):
+    temp_file = manifest_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_file, manifest_file)
+
+def build(targets=DEFAULT_TARGETS, write_intermediates=True, force=False, manifest_file=MANIFEST_FILE):
+    # Bring the targets up to date. A stage is skipped when the hashes of its
+    # inputs and code match the manifest and its output file (if it should be
+    # on disk) still has the recorded content. Stages that do run hand their
+    # output to the next stage in memory. Returns {artifact: 'built'|'skipped'}.
+    manifest = load_manifest(manifest_file)
+    contents = {}
+    hashes = {}
+    status = {}
+
+    def on_disk(name):
+        return name not in INTERMEDIATES or write_intermediates
+
+    def current_hash(name):
+        if name not in hashes:
+            if name in SOURCES:
+                text = read_artifact(name)
+                if text is None:
+                    raise FileNotFoundError(ARTIFACT_FILES[name])
+                contents[name] = text
+                hashes[name] = text_hash(text)
+            else:
+                ensure(name)
+        return hashes[name]
+
+    def content(name):
+        # The value of an artifact whose hash is already known: from memory,
+        # from disk if the file still matches, or by re-running its stage
+        if name not in contents:
+            text = read_artifact(name)
+            if text is not None and text_hash(text) == hashes[name]:
+                contents[name] = text
+            else:
+                run(name)
+        return contents[name]
+
+    def up_to_date(name, input_hashes, code):
+        record = manifest.get(name)
+        if force or not record:
+            return False
+        if record['inputs'] != input_hashes or record['code'] != code:
+            return False
+        if on_disk(name):
+            text = read_artifact(name)
+            if text is None or text_hash(text) != record['output'] or compressed_missing(name):
+                return False
+            contents[name] = text
+        return True
+
+    def ensure(name):
+        stage = STAGES[name]
+        input_hashes = {source: current_hash(source) for source in stage['inputs']}
+        code = code_hash(stage['modules'])
+
+        if up_to_date(name, input_hashes, code):
+            hashes[name] = manifest[name]['output']
+            status.setdefault(name, 'skipped')
+        else:
+            run(name)
+
+    def run(name):
+        stage = STAGES[name]
+        start = time.perf_counter()
+        with phase(name):
+            text = stage['run'](*[content(source) for source in stage['inputs']])
+        elapsed = time.perf_counter() - start
+
+        contents[name] = text
+        hashes[name] = text_hash(text)
+        with phase('write'):
+            if on_disk(name) and (read_artifact(name) != text or compressed_missing(name)):
+                write_artifact(name, text)
+
+        manifest[name] = {
+            'inputs': {source: hashes[source] for source in stage['inputs']},
+            'code': code_hash(stage['modules']),
+            'output': hashes[name],
+        }
+        status[name] = 'built'
+        print(f"  {name:<10} built in {elapsed:.3f}s -> {ARTIFACT_FILES[name]}"
+              f"{'' if on_disk(name) else ' (in memory)'}")
+
+    start = time.perf_counter()
+    for target in targets:
+        if target not in STAGES:
+            raise ValueError(f"Unknown target: {target}")
+        current_hash(target)
+
+    save_manifest(manifest_file, manifest)
+    elapsed = time.perf_counter() - start
+
+    built = sum(1 for value in status.values() if value == 'built')
+    print(f"Build finished in {elapsed * 1000:.1f} ms: {built} built, {len(status) - built} up to date")
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the Odyssey outputs, skipping stages that are up to date")
+    parser.add_argument('targets', nargs='*', default=DEFAULT_TARGETS,
+                        help=f"artifacts to build (default: {' '.join(DEFAULT_TARGETS)}; "
+                             f"available: {' '.join(STAGES)})")
+    parser.add_argument('--no-intermediates', action='store_true',
+                        help="keep intermediate texts in memory instead of writing them")
+    parser.add_argument('--force', action='store_true', help="rebuild every stage")
+    parser.add_argument('--manifest', default=MANIFEST_FILE)
+    add_profile_arguments(parser, 'build')
+    args = parser.parse_args()
+
+    outputs = [ARTIFACT_FILES[name] for name in STAGES]
+    with profile_stage('build', args.profile, args.cprofile, inputs=[ARTIFACT_FILES['raw']], outputs=outputs):
+        build(args.targets, write_intermediates=not args.no_intermediates,
+              force=args.force, manifest_file=args.manifest)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# NumPy is optional; without it the corpus keyness step is skipped
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from extract_odyssey_only import extract_odyssey_text
+from format_odyssey_nicely import format_odyssey_text
+from analyze_odyssey_stats import STOP_WORDS, iter_positioned_words, save_stats_to_json
+from keyness_stats import distinctive_terms
+from stats_cache import load_or_compute_stats
+from create_final_html import create_odyssey_html
+
+def process_text(raw_file, output_dir):
+    # Run extract -> format -> analyze -> HTML for one raw Gutenberg text,
+    # writing every artifact into its own subdirectory of output_dir.
+    name = os.path.splitext(os.path.basename(raw_file))[0]
+    text_dir = os.path.join(output_dir, name)
+    os.makedirs(text_dir, exist_ok=True)
+
+    clean_file = os.path.join(text_dir, 'clean.txt')
+    formatted_file = os.path.join(text_dir, 'formatted.txt')
+    stats_file = os.path.join(text_dir, 'stats.json')
+    cache_file = os.path.join(text_dir, 'stats.cache.json')
+    html_file = os.path.join(text_dir, 'index.html')
+
+    start = time.perf_counter()
+    result = {'name': name, 'ok': False, 'seconds': 0.0, 'error': None}
+
+    # The stage functions report progress with print(); keep workers quiet so
+    # the aggregate progress lines stay readable.
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            if os.path.exists(clean_file):
+                os.remove(clean_file)
+            extract_odyssey_text(raw_file, clean_file, streaming=True)
+            if not os.path.exists(clean_file):
+                raise ValueError("Could not find proper boundaries")
+
+            format_odyssey_text(clean_file, formatted_file)
+            stats = load_or_compute_stats(formatted_file, cache_file)
+            save_stats_to_json(stats, stats_file)
+            create_odyssey_html(formatted_file, html_file, cache_file=cache_file)
+
+            result['ok'] = True
+            result['words'] = stats['total_words']
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def find_raw_texts(input_dir):
+    return sorted(
+        os.path.join(input_dir, name)
+        for name in os.listdir(input_dir)
+        if name.endswith('.txt') and os.path.isfile(os.path.join(input_dir, name))
+    )
+
+def build_corpus(input_dir, output_dir, jobs=None):
+    raw_files = find_raw_texts(input_dir)
+    if not raw_files:
+        print(f"No .txt files found in {input_dir}")
+        return []
+
+    jobs = jobs or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Processing {len(raw_files)} texts with {jobs} worker(s)")
+    start = time.perf_counter()
+    results = []
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(process_text, raw_file, output_dir) for raw_file in raw_files]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            if result['ok']:
+                status = f"{result['words']:,} words"
+            else:
+                status = f"FAILED ({result['error']})"
+            print(f"[{done}/{len(raw_files)}] {result['name']}: {status} in {result['seconds']:.2f}s")
+
+    elapsed = time.perf_counter() - start
+    succeeded = sum(1 for result in results if result['ok'])
+    busy = sum(result['seconds'] for result in results)
+
+    print(f"\nBuilt {succeeded}/{len(raw_files)} texts in {elapsed:.2f}s wall time")
+    print(f"Total stage time: {busy:.2f}s ({busy / elapsed if elapsed else 0:.1f}x parallel speedup)")
+    print(f"Output saved to {output_dir}")
+
+    return sorted(results, key=lambda result: result['name'])
+
+def corpus_term_counts(formatted_files):
+    # Sparse (rows, columns, counts) of the text x term matrix, plus the
+    # vocabulary. Texts are counted one at a time, so only the counts of the
+    # whole corpus are held in memory, never its text.
+    vocabulary = {}
+    rows, columns, counts = [], [], []
+    for row, formatted_file in enumerate(formatted_files):
+        with open(formatted_file, 'r', encoding='utf-8') as f:
+            word_freq = Counter(word for _, _, word in iter_positioned_words(f))
+        size = len(word_freq)
+        rows.append(np.full(size, row, dtype=np.int64))
+        columns.append(np.fromiter((vocabulary.setdefault(word, len(vocabulary)) for word in word_freq),
+                                   dtype=np.int64, count=size))
+        counts.append(np.fromiter(word_freq.values(), dtype=np.int64, count=size))
+    return np.concatenate(rows), np.concatenate(columns), np.concatenate(counts), list(vocabulary)
+
+def write_corpus_keyness(results, output_dir):
+    # Distinctive terms of every successfully built text against the rest of
+    # the corpus, saved to distinctive_terms.json in output_dir
+    if np is None:
+        print("Distinctive terms skipped: numpy is not installed")
+        return None
+
+    names = [result['name'] for result in results if result['ok']]
+    if len(names) < 2:
+        print("Distinctive terms skipped: they need at least two texts")
+        return None
+
+    start = time.perf_counter()
+    rows, columns, counts, vocabulary = corpus_term_counts(
+        [os.path.join(output_dir, name, 'formatted.txt') for name in names])
+    terms = distinctive_terms(rows, columns, counts, names, vocabulary, STOP_WORDS)
+
+    output_file = os.path.join(output_dir, 'distinctive_terms.json')
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(terms, f, indent=2)
+
+    print(f"Distinctive terms of {len(names)} texts ({len(vocabulary):,} distinct words) "
+          f"in {time.perf_counter() - start:.2f}s saved to {output_file}")
+    return output_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the full pipeline over a directory of raw Gutenberg texts")
+    parser.add_argument('input_dir', help="directory containing raw Gutenberg .txt files")
+    parser.add_argument('-o', '--output-dir', default="corpus_build")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="worker processes (default: all cores)")
+    parser.add_argument('--distinctive-terms', action='store_true',
+                        help="also write each text's most distinctive words against the rest of the corpus "
+                             "to distinctive_terms.json")
+    args = parser.parse_args()
+
+    results = build_corpus(args.input_dir, args.output_dir, jobs=args.jobs)
+    if args.distinctive_terms and results:
+        write_corpus_keyness(results, args.output_dir)
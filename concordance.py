@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from bisect import bisect_right
+
+from analyze_odyssey_stats import BOOK_HEADER_PATTERN
+from stats_cache import file_hash
+from text_index import DEFAULT_TEXT_FILE, uint32_array
+
+DEFAULT_ARRAY_FILE = 'odyssey.sa'
+
+ARRAY_MAGIC = b'ODYSUFFX'
+ARRAY_VERSION = 1
+
+# magic, version, text length in characters, SHA-256 of the source text.
+# The header is followed by the suffix array and then the LCP array, both
+# little-endian uint32[length].
+HEADER = struct.Struct('<8sII32s')
+
+# Characters compared directly in the first sorting round; later rounds
+# double the compared length from here. Most suffixes of prose are already
+# unique after this many characters.
+INITIAL_PREFIX = 32
+
+def searchable_text(text):
+    # Matching ignores case and line wrapping. Both substitutions keep every
+    # character at its original offset, so matches index straight into text.
+    # No character lowercases to nothing, so equal lengths mean every one
+    # mapped to one; otherwise fold character by character, keeping those
+    # whose lowercase is longer (such as 'İ') as they are.
+    folded = text.lower()
+    if len(folded) != len(text):
+        folded = ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+    return folded.replace('\n', ' ')
+
+def build_suffix_array(text):
+    # Prefix doubling: sort suffixes by their first k characters, then order
+    # each run of suffixes that still tie by the rank of the k characters
+    # that follow, doubling k until no ties are left. A suffix's rank is the
+    # index of the first entry of its tied run, and runs that are already
+    # down to one suffix are never looked at again, so later rounds only
+    # touch the long repeated passages. Returns (sa, inverse of sa).
+    n = len(text)
+    k = INITIAL_PREFIX
+    sa = sorted(range(n), key=lambda i: text[i:i + k])
+
+    rank = [0] * n
+    ties = []
+    run_start = 0
+    for j in range(1, n + 1):
+        if j == n or text[sa[j]:sa[j] + k] != text[sa[j - 1]:sa[j - 1] + k]:
+            for i in sa[run_start:j]:
+                rank[i] = run_start
+            if j - run_start > 1:
+                ties.append((run_start, j))
+            run_start = j
+
+    while ties:
+        # Keys for the whole round are taken before any rank changes
+        sorted_runs = []
+        for start, end in ties:
+            keyed = sorted((rank[i + k] if i + k < n else -1, i) for i in sa[start:end])
+            sorted_runs.append((start, keyed))
+
+        next_ties = []
+        for start, keyed in sorted_runs:
+            end = start + len(keyed)
+            sa[start:end] = [i for _, i in keyed]
+            run_start = start
+            for j in range(start + 1, end + 1):
+                if j == end or keyed[j - start][0] != keyed[j - start - 1][0]:
+                    for _, i in keyed[run_start - start:j - start]:
+                        rank[i] = run_start
+                    if j - run_start > 1:
+                        next_ties.append((run_start, j))
+                    run_start = j
+        ties = next_ties
+        k *= 2
+
+    for j, i in enumerate(sa):
+        rank[i] = j
+    return sa, rank
+
+def build_lcp_array(text, sa, rank):
+    # Kasai's algorithm: lcp[j] is the length of the common prefix of the
+    # suffixes at sa[j - 1] and sa[j] (lcp[0] is 0)
+    n = len(text)
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        j = rank[i]
+        if j == 0:
+            h = 0
+            continue
+        other = sa[j - 1]
+        while i + h < n and other + h < n and text[i + h] == text[other + h]:
+            h += 1
+        lcp[j] = h
+        if h:
+            h -= 1
+    return lcp
+
+def build_concordance(text_file, array_file):
+    with open(text_file, 'r', encoding='utf-8') as f:
+        text = searchable_text(f.read())
+
+    start = time.perf_counter()
+    sa, rank = build_suffix_array(text)
+    lcp = build_lcp_array(text, sa, rank)
+    elapsed = time.perf_counter() - start
+
+    arrays = [uint32_array(sa), uint32_array(lcp)]
+    if sys.byteorder != 'little':
+        for values in arrays:
+            values.byteswap()
+
+    temp_file = array_file + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(ARRAY_MAGIC, ARRAY_VERSION, len(text), bytes.fromhex(file_hash(text_file))))
+        for values in arrays:
+            f.write(values.tobytes())
+    os.replace(temp_file, array_file)
+
+    print(f"Suffix array for {len(text):,} characters built in {elapsed:.1f}s -> {array_file} "
+          f"({os.path.getsize(array_file):,} bytes)")
+
+def find_passages(text):
+    # Character offsets where each book and each paragraph starts.
+    # Paragraphs are numbered like the statistics: blocks of non-blank lines
+    # separated by an empty line, counted from 0.
+    book_starts = []
+    book_names = []
+    paragraph_starts = []
+    paragraph_open = False
+    offset = 0
+
+    for line in text.splitlines(keepends=True):
+        body = line.rstrip('\n')
+        if not body:
+            paragraph_open = False
+        elif body.strip():
+            if not paragraph_open:
+                paragraph_starts.append(offset)
+                paragraph_open = True
+            header = BOOK_HEADER_PATTERN.match(body)
+            if header:
+                book_starts.append(offset)
+                book_names.append(header.group(1))
+        offset += len(line)
+
+    return book_starts, book_names, paragraph_starts
+
+def open_concordance(text_file=DEFAULT_TEXT_FILE, array_file=DEFAULT_ARRAY_FILE, rebuild=False):
+    # Map the persisted arrays, rebuilding them first if they are missing or
+    # were built from a different version of the text
+    with open(text_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    source_hash = file_hash(text_file)
+
+    mapped = None
+    if not rebuild and os.path.exists(array_file):
+        with open(array_file, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        expected = (ARRAY_MAGIC, ARRAY_VERSION, len(text), bytes.fromhex(source_hash))
+        if len(mapped) < HEADER.size or HEADER.unpack_from(mapped) != expected:
+            mapped.close()
+            mapped = None
+
+    if mapped is None:
+        build_concordance(text_file, array_file)
+        with open(array_file, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    n = len(text)
+    view = memoryview(mapped)
+    arrays = []
+    for i in range(2):
+        section = view[HEADER.size + 4 * n * i:HEADER.size + 4 * n * (i + 1)]
+        if sys.byteorder == 'little':
+            arrays.append(section.cast('I'))
+        else:
+            values = uint32_array()
+            values.frombytes(section)
+            values.byteswap()
+            arrays.append(values)
+
+    book_starts, book_names, paragraph_starts = find_passages(text)
+    return {
+        'text': text,
+        'search_text': searchable_text(text),
+        'mmap': mapped,
+        'sa': arrays[0],
+        'lcp': arrays[1],
+        'book_starts': book_starts,
+        'book_names': book_names,
+        'paragraph_starts': paragraph_starts,
+    }
+
+def close_concordance(concordance):
+    for name in ('sa', 'lcp'):
+        if isinstance(concordance[name], memoryview):
+            concordance[name].release()
+    concordance['mmap'].close()
+
+def suffix_range(concordance, query):
+    # [first, end) of the suffix array entries starting with query: a binary
+    # search for the first, then the LCP array extends the run, so the cost
+    # is O(len(query) * log n) plus one step per occurrence
+    query = searchable_text(query)
+    text = concordance['search_text']
+    sa = concordance['sa']
+    lcp = concordance['lcp']
+    m = len(query)
+    if not m:
+        return 0, 0
+
+    low, high = 0, len(sa)
+    while low < high:
+        mid = (low + high) // 2
+        start = sa[mid]
+        if text[start:start + m] < query:
+            low = mid + 1
+        else:
+            high = mid
+
+    if low == len(sa) or text[sa[low]:sa[low] + m] != query:
+        return low, low
+
+    end = low + 1
+    while end < len(sa) and lcp[end] >= m:
+        end += 1
+    return low, end
+
+def find_occurrences(concordance, query):
+    # Character offsets of every occurrence of query, in text order
+    first, end = suffix_range(concordance, query)
+    return sorted(concordance['sa'][first:end])
+
+def count_occurrences(concordance, query):
+    first, end = suffix_range(concordance, query)
+    return end - first
+
+def locate(concordance, offset):
+    # (book, paragraph) of a character offset; book is None before BOOK I
+    book = bisect_right(concordance['book_starts'], offset) - 1
+    paragraph = bisect_right(concordance['paragraph_starts'], offset) - 1
+    return (concordance['book_names'][book] if book >= 0 else None,
+            paragraph if paragraph >= 0 else None)
+
+def keyword_in_context(concordance, query, width=40):
+    # (book, paragraph, left context, match, right context) per occurrence,
+    # with line breaks shown as spaces
+    text = concordance['text']
+    length = len(query)
+    lines = []
+    for offset in find_occurrences(concordance, query):
+        book, paragraph = locate(concordance, offset)
+        left = text[max(offset - width, 0):offset]
+        match = text[offset:offset + length]
+        right = text[offset + length:offset + length + width]
+        lines.append((book, paragraph,
+                      ' '.join(left.split('\n')), ' '.join(match.split('\n')), ' '.join(right.split('\n'))))
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keyword-in-context concordance for any substring of the text")
+    parser.add_argument('query', nargs='?', help="substring to look up (case-insensitive, may span line breaks)")
+    parser.add_argument('-w', '--width', type=int, default=40, help="characters of context on each side")
+    parser.add_argument('--limit', type=int, default=50, help="lines to print")
+    parser.add_argument('--text', default=DEFAULT_TEXT_FILE)
+    parser.add_argument('--array-file', default=DEFAULT_ARRAY_FILE)
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the suffix array even if it is current")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    concordance = open_concordance(args.text, args.array_file, rebuild=args.rebuild)
+    opened = time.perf_counter() - start
+
+    if args.query:
+        start = time.perf_counter()
+        lines = keyword_in_context(concordance, args.query, args.width)
+        elapsed = time.perf_counter() - start
+
+        for book, paragraph, left, match, right in lines[:args.limit]:
+            paragraph = paragraph if paragraph is not None else '-'
+            print(f"Book {book or '-':<6} ¶{paragraph:<5} {left:>{args.width}}[{match}]{right}")
+        if len(lines) > args.limit:
+            print(f"... {len(lines) - args.limit:,} more")
+
+        print(f"\n{len(lines):,} occurrences in {elapsed * 1000:.3f} ms (opened in {opened * 1000:.1f} ms)")
+
+    close_concordance(concordance)
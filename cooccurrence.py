@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import json
+import time
+from bisect import bisect_right
+from collections import Counter, deque
+
+from analyze_odyssey_stats import ENTITY_GROUPS, build_entity_index, iter_positioned_words
+from text_index import DEFAULT_TEXT_FILE
+
+DEFAULT_JSON_FILE = 'odyssey_cooccurrence.json'
+DEFAULT_CSV_FILE = 'odyssey_cooccurrence.csv'
+
+UNITS = ('sentence', 'paragraph', 'window')
+DEFAULT_WINDOW = 50
+
+def collect_mentions(lines, kinds=('characters',)):
+    # [(offset, sentence, paragraph, name), ...] for every mention of the
+    # given entity kinds, in text order, from one pass over the words
+    sentence_ends = []
+    index = build_entity_index(iter_positioned_words(lines, sentence_ends=sentence_ends))
+
+    mentions = []
+    for kind in kinds:
+        for name, positions in index[kind].items():
+            mentions.extend((offset, bisect_right(sentence_ends, offset), paragraph, name)
+                            for _, paragraph, offset in positions)
+    mentions.sort()
+    return mentions
+
+def pair(first, second):
+    return (first, second) if first < second else (second, first)
+
+def unit_cooccurrence(mentions, unit_of):
+    # Number of units (sentences or paragraphs) in which each pair of names
+    # both appear. Only the names of the current unit are held, and each new
+    # name is paired with them once, so the cost follows the mentions rather
+    # than the square of the number of names.
+    pairs = Counter()
+    current = None
+    names = set()
+    for mention in mentions:
+        unit = unit_of(mention)
+        if unit != current:
+            current = unit
+            names = set()
+        name = mention[3]
+        if name not in names:
+            for other in names:
+                pairs[pair(name, other)] += 1
+            names.add(name)
+    return pairs
+
+def window_cooccurrence(mentions, window):
+    # Number of mention pairs of two different names at most `window` words
+    # apart. The mentions within reach of the current one are kept in a
+    # sliding window, so each is compared only with its near neighbours.
+    pairs = Counter()
+    recent = deque()
+    for offset, _, _, name in mentions:
+        while recent and offset - recent[0][0] > window:
+            recent.popleft()
+        for _, other in recent:
+            if other != name:
+                pairs[pair(name, other)] += 1
+        recent.append((offset, name))
+    return pairs
+
+def cooccurrence(mentions, unit='sentence', window=DEFAULT_WINDOW):
+    # Sparse co-occurrence counts {(name, other): count} with name < other
+    if unit == 'sentence':
+        return unit_cooccurrence(mentions, lambda mention: mention[1])
+    if unit == 'paragraph':
+        return unit_cooccurrence(mentions, lambda mention: mention[2])
+    return window_cooccurrence(mentions, window)
+
+def edge_list(pairs):
+    # [[source, target, weight], ...], heaviest first
+    return [[first, second, count]
+            for (first, second), count in sorted(pairs.items(), key=lambda item: (-item[1], item[0]))]
+
+def adjacency(pairs):
+    # {name: {neighbour: weight}}, symmetric, neighbours heaviest first
+    neighbours = {}
+    for first, second, count in edge_list(pairs):
+        neighbours.setdefault(first, {})[second] = count
+        neighbours.setdefault(second, {})[first] = count
+    return dict(sorted(neighbours.items()))
+
+def network_to_json(mentions, pairs, unit, window, kinds):
+    return {
+        'kinds': list(kinds),
+        'unit': unit,
+        'window': window if unit == 'window' else None,
+        'mentions': dict(Counter(name for _, _, _, name in mentions).most_common()),
+        'edges': edge_list(pairs),
+        'adjacency': adjacency(pairs),
+    }
+
+def save_network(network, json_file, csv_file=None):
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(network, f, indent=2)
+
+    if csv_file:
+        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['source', 'target', 'weight'])
+            writer.writerows(network['edges'])
+
+def build_network(text_file, unit='sentence', window=DEFAULT_WINDOW, kinds=('characters',)):
+    with open(text_file, 'r', encoding='utf-8') as f:
+        mentions = collect_mentions(f, kinds)
+    return network_to_json(mentions, cooccurrence(mentions, unit, window), unit, window, kinds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Character co-occurrence network as an edge list and adjacency JSON")
+    parser.add_argument('--text', default=DEFAULT_TEXT_FILE)
+    parser.add_argument('--unit', choices=UNITS, default='sentence',
+                        help="count names that share a sentence, a paragraph, or a window of words")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help=f"with --unit window: greatest distance in words (default: {DEFAULT_WINDOW})")
+    parser.add_argument('--kinds', nargs='+', choices=list(ENTITY_GROUPS), default=['characters'],
+                        help="entity groups to include (default: characters)")
+    parser.add_argument('--output', default=DEFAULT_JSON_FILE, help="edge list and adjacency as JSON")
+    parser.add_argument('--csv', nargs='?', const=DEFAULT_CSV_FILE, metavar='FILE',
+                        help=f"also write the edge list as CSV (default: {DEFAULT_CSV_FILE})")
+    parser.add_argument('--limit', type=int, default=10, help="edges to print")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    network = build_network(args.text, args.unit, args.window, args.kinds)
+    elapsed = time.perf_counter() - start
+    save_network(network, args.output, args.csv)
+
+    scope = f"{args.window}-word window" if args.unit == 'window' else args.unit
+    print(f"{sum(network['mentions'].values()):,} mentions of {len(network['mentions'])} names, "
+          f"{len(network['edges']):,} edges by {scope} in {elapsed:.2f}s")
+    print(f"Network saved to {args.output}" + (f" and {args.csv}" if args.csv else ""))
+    print(f"\nTop {args.limit} pairs:")
+    for first, second, count in network['edges'][:args.limit]:
+        print(f"  {first} - {second}: {count}")
@@ -1,20 +1,24 @@
 #!/usr/bin/env python3
+import argparse
+import hashlib
 import html
-import re
+import io
 import json
 import os
-
-def create_odyssey_html(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    # Load statistics if available
-    stats = {}
-    if os.path.exists('odyssey_stats.json'):
-        with open('odyssey_stats.json', 'r', encoding='utf-8') as f:
-            stats = json.load(f)
-
-    html_content = """<!DOCTYPE html>
+import re
+import zlib
+
+from analyze_odyssey_stats import WORD_PATTERN
+from instrumentation import add_profile_arguments, phase, profile_stage, timed_writes
+from precompress import (
+    GZIP_HEADER, compress_files, content_hash, deflate_piece, gzip_from_pieces, hashed_name, is_hashed_name,
+    remove_brotli, write_bytes,
+)
+from stats_cache import DEFAULT_CACHE_FILE, file_hash, load_or_compute_stats
+
+# The page is written as a sequence of precompiled chunks: static template
+# text around the generated navigation, book sections and statistics.
+PAGE_HEAD_START = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -271,6 +275,50 @@ def create_odyssey_html(input_file, output_file):
             font-weight: bold;
         }
 
+        .stat-terms {
+            text-align: right;
+            color: #7f8c8d;
+        }
+
+        .sparkline {
+            width: 140px;
+            height: 22px;
+        }
+
+        .sparkline polyline {
+            fill: none;
+            stroke: var(--accent);
+            stroke-width: 1.5;
+            vector-effect: non-scaling-stroke;
+        }
+
+        .histogram {
+            display: flex;
+            align-items: flex-end;
+            gap: 2px;
+            height: 120px;
+            border-bottom: 2px solid var(--bg-light);
+        }
+
+        .histogram-bar {
+            flex: 1;
+            min-height: 1px;
+            background: var(--accent);
+            border-radius: 2px 2px 0 0;
+        }
+
+        .histogram-bar:hover {
+            background: var(--gold);
+        }
+
+        .histogram-axis {
+            display: flex;
+            justify-content: space-between;
+            font-size: 0.85em;
+            color: #7f8c8d;
+            margin: 5px 0 15px;
+        }
+
         .basic-stats {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
@@ -418,7 +466,9 @@ def create_odyssey_html(input_file, output_file):
                 page-break-before: always;
             }
         }
-    </style>
+"""
+
+PAGE_HEAD_END = """    </style>
 </head>
 <body>
     <div class="ocean-bg"></div>
@@ -436,163 +486,92 @@ def create_odyssey_html(input_file, output_file):
                 <option value="">Navigate to Book...</option>
 """
 
-    # Find all books and add to navigation
-    book_pattern = re.compile(r'^BOOK ([IVXLCDM]+)$')
-    books_found = []
+NAV_OPTION = '                <option value="book-{0}">{0}</option>\n'
 
-    for line in lines:
-        match = book_pattern.match(line.strip())
-        if match:
-            book_num = match.group(1)
-            books_found.append(book_num)
-            html_content += f'                <option value="book-{book_num}">{book_num}</option>\n'
+SELECT_END = """            </select>
+"""
 
-    html_content += """            </select>
-            <button onclick="toggleStats()">📊 View Statistics</button>
+NAV_END = """            <button onclick="toggleStats()">📊 View Statistics</button>
         </nav>
 
         <div class="content">
 """
 
-    current_book = None
-    in_book = False
+BOOK_SECTION_OPEN = '<div class="book-section" id="book-{0}">\n'
+BOOK_HEADER = '<h2 class="book-header">Book {0}</h2>\n'
+BOOK_END = '</div>\n'
+SUBTITLE = '<div class="chapter-subtitle">{}</div>\n'
+FOOTNOTE = '<div class="footnote">{}</div>\n'
+PARAGRAPH = '<p>{}</p>\n'
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        # Escape HTML characters
-        line = html.escape(line)
-
-        # Check for BOOK header
-        match = book_pattern.match(line)
-        if match:
-            if current_book:
-                html_content += '</div>\n'
-            book_num = match.group(1)
-            html_content += f'<div class="book-section" id="book-{book_num}">\n'
-            html_content += f'<h2 class="book-header">Book {book_num}</h2>\n'
-            current_book = book_num
-            in_book = True
-            continue
-
-        # Check for chapter subtitle (all caps, multi-word)
-        if (line.isupper() and
-            len(line.split()) > 2 and
-            not line.startswith('BOOK') and
-            len(line) < 100):
-            html_content += f'<div class="chapter-subtitle">{line}</div>\n'
-            continue
-
-        # Check for footnotes
-        if line.startswith('[') and line.endswith(']'):
-            html_content += f'<div class="footnote">{line}</div>\n'
-            continue
-
-        # Regular paragraph - add superscript formatting for footnote numbers
-        # Convert standalone numbers to superscript (e.g., "text.14 more text" -> "text.<sup>14</sup> more text")
-        formatted_line = re.sub(r'\.(\d+)\s', r'.<sup>\1</sup> ', line)
-
-        html_content += f'<p>{formatted_line}</p>\n'
-
-    if current_book:
-        html_content += '</div>\n'
-
-    # Add statistics section if stats are available
-    if stats:
-        html_content += f"""
+CONTENT_CLOSE = """
         </div>
+"""
 
+STATISTICS_OPEN = """
         <div class="statistics" id="statisticsSection">
-            <h3 style="color: var(--primary); margin-bottom: 30px; text-align: center; font-size: 2em;">📊 Text Analysis & Statistics</h3>
+"""
+
+STATS_PANEL_HEADER = """            <h3 style="color: var(--primary); margin-bottom: 30px; text-align: center; font-size: 2em;">📊 Text Analysis & Statistics</h3>
 
             <div class="basic-stats">
                 <div class="basic-stat">
-                    <span class="number">{stats.get('total_words', 0):,}</span>
+                    <span class="number">{total_words:,}</span>
                     <span class="label">Total Words</span>
                 </div>
                 <div class="basic-stat">
-                    <span class="number">{stats.get('unique_words', 0):,}</span>
+                    <span class="number">{unique_words:,}</span>
                     <span class="label">Unique Words</span>
                 </div>
                 <div class="basic-stat">
-                    <span class="number">{stats.get('total_sentences', 0):,}</span>
+                    <span class="number">{total_sentences:,}</span>
                     <span class="label">Sentences</span>
                 </div>
                 <div class="basic-stat">
-                    <span class="number">{stats.get('total_books', 0)}</span>
+                    <span class="number">{total_books}</span>
                     <span class="label">Books</span>
                 </div>
                 <div class="basic-stat">
-                    <span class="number">{stats.get('avg_word_length', 0):.1f}</span>
+                    <span class="number">{avg_word_length:.1f}</span>
                     <span class="label">Avg Word Length</span>
                 </div>
                 <div class="basic-stat">
-                    <span class="number">{stats.get('avg_words_per_sentence', 0):.1f}</span>
+                    <span class="number">{avg_words_per_sentence:.1f}</span>
                     <span class="label">Words/Sentence</span>
                 </div>
             </div>
 
             <div class="stats-grid">
-                <div class="stat-section">
-                    <h4>Place Mentions</h4>
-                    <ul class="stat-list">"""
-
-        # Add top 25 place mentions
-        for place, count in stats.get('place_mentions', [])[:25]:
-            html_content += f'                        <li><span>{place.title()}</span> <span class="stat-number">{count}</span></li>\n'
-
-        html_content += """                    </ul>
-                </div>
-
-                <div class="stat-section">
-                    <h4>Character Mentions</h4>
-                    <ul class="stat-list">"""
-
-        # Add character mentions
-        for name, count in stats.get('character_mentions', [])[:15]:
-            html_content += f'                        <li><span>{name.title()}</span> <span class="stat-number">{count}</span></li>\n'
-
-        html_content += """                    </ul>
-                </div>
-
-                <div class="stat-section">
-                    <h4>Longest Words</h4>
-                    <ul class="stat-list">"""
-
-        # Add longest words
-        for word in stats.get('longest_words', [])[:15]:
-            html_content += f'                        <li><span>{word.title()}</span> <span class="stat-number">{len(word)} letters</span></li>\n'
-
-        html_content += """                    </ul>
-                </div>
-
-                <div class="stat-section">
-                    <h4>Most Common Stop Words</h4>
-                    <ul class="stat-list">"""
-
-        # Add stop words
-        for word, count in stats.get('most_common_stop_words', [])[:15]:
-            html_content += f'                        <li><span>{word.title()}</span> <span class="stat-number">{count}</span></li>\n'
+"""
 
-        html_content += """                    </ul>
+STAT_SECTION_START = '''                <div class="stat-section">
+                    <h4>{}</h4>
+                    <ul class="stat-list">'''
+STAT_ITEM = '                        <li><span>{}</span> <span class="stat-number">{}</span></li>\n'
+STAT_TERMS_ITEM = '                        <li><span>{}</span> <span class="stat-terms">{}</span></li>\n'
+STAT_SPARKLINE_ITEM = '                        <li><span>{}</span> {}</li>\n'
+SPARKLINE = ('<svg class="sparkline" viewBox="0 0 {} 100" preserveAspectRatio="none" role="img" '
+             'aria-label="{}"><title>{}</title><polyline points="{}"/></svg>')
+STAT_SECTION_END = '''                    </ul>
                 </div>
-            </div>
-        </div>
-
-        <footer>
-            <p>Homer's Odyssey • Translated by Samuel Butler</p>
-            <p>This edition from <a href="https://www.gutenberg.org">Project Gutenberg</a></p>
-        </footer>
-    </div>
+'''
+
+HISTOGRAM_START = '''                <div class="stat-section">
+                    <h4>{}</h4>
+                    <div class="histogram">
+'''
+HISTOGRAM_BAR = '                        <div class="histogram-bar" style="height: {:.1f}%" title="{}: {:,}"></div>\n'
+HISTOGRAM_END = '''                    </div>
+                    <div class="histogram-axis"><span>{}</span><span>{}</span></div>
+                    <ul class="stat-list">'''
+
+STATS_PANEL_END = """            </div>
+"""
 
-    <div class="back-to-top" onclick="scrollToTop()" id="backToTop">↑</div>
-    <div class="selection-counter" id="selectionCounter"></div>"""
-    else:
-        html_content += """
-        </div>
+STATISTICS_CLOSE = """        </div>
+"""
 
+PAGE_FOOTER = """
         <footer>
             <p>Homer's Odyssey • Translated by Samuel Butler</p>
             <p>This edition from <a href="https://www.gutenberg.org">Project Gutenberg</a></p>
@@ -602,7 +581,7 @@ def create_odyssey_html(input_file, output_file):
     <div class="back-to-top" onclick="scrollToTop()" id="backToTop">↑</div>
     <div class="selection-counter" id="selectionCounter"></div>"""
 
-    html_content += """
+PAGE_SCRIPT = """
 
     <script>
         function jumpToBook() {
@@ -698,14 +677,979 @@ def create_odyssey_html(input_file, output_file):
 
         // Initialize
         document.getElementById('backToTop').style.display = 'none';
-    </script>
+    </script>"""
+
+PAGE_END = """
 </body>
 </html>"""
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+# Full-text search: a search box in the navigation answering queries from a
+# separately loaded inverted index (see build_search_index)
+SEARCH_STYLE = """
+        nav input[type="search"] {
+            padding: 10px 15px;
+            font-size: 1.1em;
+            border: none;
+            border-radius: 5px;
+            font-family: inherit;
+            width: 260px;
+            max-width: 100%;
+        }
+
+        .search-results {
+            display: none;
+            position: absolute;
+            top: 100%;
+            left: 20px;
+            right: 20px;
+            max-height: 60vh;
+            overflow-y: auto;
+            background: white;
+            border-radius: 0 0 5px 5px;
+            box-shadow: 0 10px 30px rgba(0,0,0,0.3);
+        }
+
+        .search-results.show {
+            display: block;
+        }
+
+        .search-summary {
+            padding: 10px 20px;
+            color: #7f8c8d;
+            font-style: italic;
+        }
+
+        .search-result {
+            padding: 10px 20px;
+            border-top: 1px solid var(--bg-light);
+            cursor: pointer;
+        }
+
+        .search-result:hover, .search-result:focus {
+            background: #fdf6e3;
+            outline: none;
+        }
+
+        .search-result strong {
+            color: var(--primary);
+            margin-right: 10px;
+        }
+
+        .search-hit {
+            background: #fff3c4;
+            transition: background 1s;
+        }
+"""
+
+SEARCH_BOX = """            <input type="search" id="searchBox" placeholder="Search the text (tele* for prefixes)" autocomplete="off" data-index="{0}">
+            <div class="search-results" id="searchResults"></div>
+"""
+
+SEARCH_SCRIPT = """
+
+    <script>
+        // Queries are answered from the inverted index alone; it is fetched
+        // the first time the search box is used
+        const searchBox = document.getElementById('searchBox');
+        const searchResults = document.getElementById('searchResults');
+        const maxSearchResults = 100;
+        let searchIndexRequest = null;
+
+        function loadSearchIndex() {
+            if (!searchIndexRequest) {
+                searchIndexRequest = fetch(searchBox.dataset.index)
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error(`search index: HTTP ${response.status}`);
+                        }
+                        return response.json();
+                    })
+                    .catch(error => {
+                        searchIndexRequest = null;
+                        throw error;
+                    });
+            }
+            return searchIndexRequest;
+        }
+
+        function lowerBound(values, target) {
+            let low = 0, high = values.length;
+            while (low < high) {
+                const mid = (low + high) >> 1;
+                if (values[mid] < target) {
+                    low = mid + 1;
+                } else {
+                    high = mid;
+                }
+            }
+            return low;
+        }
+
+        // Paragraph numbers for one term; "word*" matches every word with that prefix
+        function termParagraphs(index, term) {
+            const prefix = term.endsWith('*');
+            const stem = prefix ? term.slice(0, -1) : term;
+            const found = new Set();
+            for (let i = lowerBound(index.words, stem); i < index.words.length; i++) {
+                const word = index.words[i];
+                if (prefix ? !word.startsWith(stem) : word !== stem) {
+                    break;
+                }
+                let paragraph = 0;
+                for (const gap of index.postings[i]) {
+                    paragraph += gap;
+                    found.add(paragraph);
+                }
+            }
+            return found;
+        }
+
+        function searchParagraphs(index, query) {
+            const terms = query.toLowerCase().match(/[a-z]+\\*?/g) || [];
+            if (!terms.length) {
+                return null;
+            }
+            const sets = terms.map(term => termParagraphs(index, term)).sort((a, b) => a.size - b.size);
+            return [...sets[0]]
+                .filter(paragraph => sets.every(set => set.has(paragraph)))
+                .sort((a, b) => a - b);
+        }
+
+        // Global paragraph number -> [book, paragraph within the book]
+        function locateParagraph(index, paragraph) {
+            const book = lowerBound(index.starts, paragraph + 1) - 1;
+            return [index.books[book], paragraph - index.starts[book]];
+        }
+
+        function paragraphElement(book, paragraph) {
+            const section = document.getElementById('book-' + book);
+            return section && section.children[paragraph + 1];
+        }
+
+        function showParagraph(book, paragraph) {
+            const section = document.getElementById('book-' + book);
+            const ready = typeof loadFragment === 'function' ? loadFragment(section) : Promise.resolve(section);
+            ready.then(() => {
+                const element = paragraphElement(book, paragraph);
+                if (element) {
+                    element.scrollIntoView({ behavior: 'smooth', block: 'center' });
+                    element.classList.add('search-hit');
+                    setTimeout(() => element.classList.remove('search-hit'), 2500);
+                }
+            });
+            searchResults.classList.remove('show');
+        }
+
+        function renderSearchResults(index, query) {
+            const paragraphs = searchParagraphs(index, query);
+            searchResults.replaceChildren();
+            if (!paragraphs) {
+                searchResults.classList.remove('show');
+                return;
+            }
+
+            const summary = document.createElement('div');
+            summary.className = 'search-summary';
+            summary.textContent = paragraphs.length > maxSearchResults
+                ? `${paragraphs.length} passages, showing the first ${maxSearchResults}`
+                : `${paragraphs.length} passage${paragraphs.length === 1 ? '' : 's'}`;
+            searchResults.appendChild(summary);
+
+            paragraphs.slice(0, maxSearchResults).forEach(paragraph => {
+                const [book, number] = locateParagraph(index, paragraph);
+                const result = document.createElement('div');
+                result.className = 'search-result';
+                result.tabIndex = 0;
+                const label = document.createElement('strong');
+                label.textContent = `Book ${book}, ¶${number + 1}`;
+                result.appendChild(label);
+
+                // Books that have not been loaded yet are listed without a preview
+                const element = paragraphElement(book, number);
+                if (element) {
+                    const text = element.textContent;
+                    result.appendChild(document.createTextNode(text.length > 120 ? text.slice(0, 120) + '…' : text));
+                }
+
+                result.onclick = () => showParagraph(book, number);
+                result.onkeydown = event => {
+                    if (event.key === 'Enter') {
+                        showParagraph(book, number);
+                    }
+                };
+                searchResults.appendChild(result);
+            });
+
+            searchResults.classList.add('show');
+        }
+
+        searchBox.addEventListener('focus', () => loadSearchIndex().catch(() => {}));
+
+        searchBox.addEventListener('input', () => {
+            const query = searchBox.value;
+            loadSearchIndex()
+                .then(index => {
+                    if (searchBox.value === query) {
+                        renderSearchResults(index, query);
+                    }
+                })
+                .catch(error => {
+                    searchResults.textContent = 'Search is unavailable: ' + error.message;
+                    searchResults.classList.add('show');
+                });
+        });
+
+        searchBox.addEventListener('keydown', event => {
+            if (event.key === 'Escape') {
+                searchResults.classList.remove('show');
+            }
+        });
+
+        document.addEventListener('click', event => {
+            if (!searchResults.contains(event.target) && event.target !== searchBox) {
+                searchResults.classList.remove('show');
+            }
+        });
+    </script>"""
+
+# Split output: a light shell page whose book sections and statistics panel
+# are placeholders, filled in from per-book fragment files on demand
+SPLIT_STYLE = """
+        .book-section.pending {
+            min-height: 100vh;
+        }
+
+        .book-section.pending::after {
+            content: 'Loading…';
+            display: block;
+            color: #7f8c8d;
+            font-style: italic;
+        }
+"""
+
+BOOK_PLACEHOLDER = '<div class="book-section pending" id="book-{0}" data-fragment="{1}">\n<h2 class="book-header">Book {0}</h2>\n</div>\n'
+
+STATISTICS_PLACEHOLDER = """
+        <div class="statistics" id="statisticsSection" data-fragment="{0}"></div>
+"""
+
+SPLIT_SCRIPT = """
+
+    <script>
+        // Book sections and the statistics panel are fetched on first use
+        const fragmentRequests = {};
+
+        function loadFragment(element) {
+            if (!element || !element.dataset.fragment) {
+                return Promise.resolve(element);
+            }
+            const url = element.dataset.fragment;
+            if (!fragmentRequests[url]) {
+                fragmentRequests[url] = fetch(url)
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error(`${url}: HTTP ${response.status}`);
+                        }
+                        return response.text();
+                    })
+                    .then(text => {
+                        element.innerHTML = text;
+                        element.classList.remove('pending');
+                        delete element.dataset.fragment;
+                        return element;
+                    })
+                    .catch(error => {
+                        delete fragmentRequests[url];
+                        throw error;
+                    });
+            }
+            return fragmentRequests[url];
+        }
+
+        function jumpToBook() {
+            const selector = document.getElementById('bookSelector');
+            const bookId = selector.value;
+            if (bookId) {
+                const section = document.getElementById(bookId);
+                loadFragment(section).then(() => section.scrollIntoView({ behavior: 'smooth' }));
+                history.replaceState(null, '', '#' + bookId);
+                selector.value = '';
+            }
+        }
+
+        function toggleStats() {
+            const statsSection = document.getElementById('statisticsSection');
+            if (statsSection) {
+                loadFragment(statsSection).then(() => {
+                    statsSection.classList.toggle('active');
+                    if (statsSection.classList.contains('active')) {
+                        statsSection.scrollIntoView({ behavior: 'smooth' });
+                    }
+                });
+            }
+        }
+
+        // Load books shortly before they scroll into view
+        const bookObserver = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                if (entry.isIntersecting) {
+                    bookObserver.unobserve(entry.target);
+                    loadFragment(entry.target);
+                }
+            });
+        }, { rootMargin: '600px 0px' });
+
+        document.querySelectorAll('.book-section.pending').forEach(section => bookObserver.observe(section));
+
+        // Open at the book named in the URL, e.g. index.html#book-IX
+        const initialBook = location.hash && document.getElementById(location.hash.slice(1));
+        if (initialBook && initialBook.dataset.fragment) {
+            loadFragment(initialBook).then(() => initialBook.scrollIntoView());
+        }
+    </script>"""
+
+BOOK_PATTERN = re.compile(r'^BOOK ([IVXLCDM]+)$')
+FOOTNOTE_NUMBER_PATTERN = re.compile(r'\.(\d+)\s')
+FRAGMENT_FILE_PATTERN = re.compile(r'^((?:book-[IVXLCDM]+|stats)\.[0-9a-f]+\.html)(?:\.gz|\.br)?$')
+
+def split_books(lines):
+    # Group the stripped, escaped, non-empty lines by book. Yields
+    # (book_num, book_lines); book_num is None for text before the first BOOK.
+    current_book = None
+    book_lines = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        # Escape HTML characters
+        line = html.escape(line)
+
+        # Check for BOOK header
+        match = BOOK_PATTERN.match(line)
+        if match:
+            if current_book or book_lines:
+                yield current_book, book_lines
+            current_book = match.group(1)
+            book_lines = []
+            continue
+
+        book_lines.append(line)
+
+    if current_book or book_lines:
+        yield current_book, book_lines
+
+def write_content_line(out, line):
+    # Write one stripped, escaped, non-header line of the text
+    # Check for chapter subtitle (all caps, multi-word)
+    if (line.isupper() and
+        len(line.split()) > 2 and
+        not line.startswith('BOOK') and
+        len(line) < 100):
+        out.write(SUBTITLE.format(line))
+        return
+
+    # Check for footnotes
+    if line.startswith('[') and line.endswith(']'):
+        out.write(FOOTNOTE.format(line))
+        return
+
+    # Regular paragraph - add superscript formatting for footnote numbers
+    # Convert standalone numbers to superscript (e.g., "text.14 more text" -> "text.<sup>14</sup> more text")
+    formatted_line = FOOTNOTE_NUMBER_PATTERN.sub(r'.<sup>\1</sup> ', line)
+
+    out.write(PARAGRAPH.format(formatted_line))
+
+def write_stat_sections(out, sections):
+    # sections: (title, [(label, value), ...]) for each box in the stats grid
+    for i, (title, items) in enumerate(sections):
+        if i:
+            out.write('\n')
+        out.write(STAT_SECTION_START.format(title))
+        for label, value in items:
+            out.write(STAT_ITEM.format(label, value))
+        out.write(STAT_SECTION_END)
+
+def write_histogram_section(out, title, bars, axis, items):
+    # A stat section headed by a bar chart; bars: (label, count) in order
+    tallest = max((count for _, count in bars), default=0) or 1
+    out.write(HISTOGRAM_START.format(title))
+    for label, count in bars:
+        out.write(HISTOGRAM_BAR.format(100 * count / tallest, html.escape(label), count))
+    out.write(HISTOGRAM_END.format(*axis))
+    for label, value in items:
+        out.write(STAT_ITEM.format(label, value))
+    out.write(STAT_SECTION_END)
+
+def write_length_sections(out, stats):
+    # Word and sentence length distributions, when the statistics have them
+    # (they need NumPy at analysis time)
+    words = stats.get('word_length_distribution')
+    sentences = stats.get('sentence_length_distribution')
+    if not words or not sentences:
+        return
+
+    out.write('\n')
+    word_bars = [(f"{length} letter{'s' if length != 1 else ''}", count) for length, count in words['histogram']]
+    write_histogram_section(out, 'Word Lengths', word_bars, (word_bars[0][0], word_bars[-1][0]), [
+        ('Median', f"{words['percentiles']['p50']:g} letters"),
+        ('90th percentile', f"{words['percentiles']['p90']:g} letters"),
+        ('99th percentile', f"{words['percentiles']['p99']:g} letters"),
+        ('Standard deviation', f"{words['std']:.2f}"),
+    ])
+
+    out.write('\n')
+    sentence_bars = [(f'{label} words', count) for label, count in sentences['histogram']]
+    write_histogram_section(out, 'Sentence Lengths', sentence_bars, (sentence_bars[0][0], sentence_bars[-1][0]), [
+        ('Median', f"{sentences['percentiles']['p50']:g} words"),
+        ('90th percentile', f"{sentences['percentiles']['p90']:g} words"),
+        ('99th percentile', f"{sentences['percentiles']['p99']:g} words"),
+        ('Standard deviation', f"{sentences['std']:.2f}"),
+        ('Longest sentence', f"{sentences['max']:,} words"),
+    ])
+
+    out.write('\n')
+    write_stat_sections(out, [
+        ('Sentence Length by Book',
+         [(f'Book {book}', f"{lengths['sentence_length_mean']:.1f} ± {lengths['sentence_length_variance'] ** 0.5:.1f}")
+          for book, lengths in stats.get('per_book', {}).items() if 'sentence_length_mean' in lengths]),
+    ])
+
+def write_distinctive_terms_section(out, stats, limit=5):
+    # Each book's most distinctive words by log-likelihood against the rest of
+    # the poem, when the statistics have them (they need NumPy at analysis time)
+    books = [(book, summary['distinctive_terms']['log_likelihood'][:limit])
+             for book, summary in stats.get('per_book', {}).items()
+             if summary.get('distinctive_terms', {}).get('log_likelihood')]
+    if not books:
+        return
+
+    out.write('\n')
+    out.write(STAT_SECTION_START.format('Distinctive Vocabulary by Book'))
+    for book, terms in books:
+        out.write(STAT_TERMS_ITEM.format(f'Book {book}', ', '.join(term for term, _, _ in terms)))
+    out.write(STAT_SECTION_END)
+
+def sparkline(counts, label, title):
+    # Inline SVG line of counts, scaled to the largest; one unit per count
+    # across, 100 units up with a margin so the stroke is not clipped
+    tallest = max(counts) or 1
+    if len(counts) == 1:
+        counts = counts * 2
+    points = ' '.join(f'{x},{95 - 90 * count / tallest:.0f}' for x, count in enumerate(counts))
+    return SPARKLINE.format(len(counts) - 1, html.escape(label), html.escape(title), points)
+
+def write_timeline_sections(out, stats, limit=12):
+    # Where in the poem the most mentioned characters and places appear, as
+    # a sparkline of their mentions per stretch of words. The counts come
+    # precomputed with the statistics; nothing is computed in the browser.
+    timeline = stats.get('mention_timeline')
+    if not timeline:
+        return
+
+    books = timeline['books']
+    for kind, title in (('characters', 'Character Timeline'), ('places', 'Place Timeline')):
+        names = list(timeline.get(kind, {}).items())[:limit]
+        if not names:
+            continue
+        out.write('\n')
+        out.write(STAT_SECTION_START.format(title))
+        for name, counts in names:
+            label = name.title()
+            summary = f"{label}: {sum(counts['per_bucket'])} mentions"
+            per_book = counts['per_book']
+            if books and max(per_book):
+                summary += f", most in Book {books[per_book.index(max(per_book))]}"
+            out.write(STAT_SPARKLINE_ITEM.format(
+                label, sparkline(counts['per_bucket'], f"{label} mentions through the poem", summary)))
+        out.write(STAT_SECTION_END)
+
+def write_book(out, book_num, book_lines):
+    # The inside of a book section: its heading and text
+    out.write(BOOK_HEADER.format(book_num))
+    for line in book_lines:
+        write_content_line(out, line)
+
+def write_stats_panel(out, stats):
+    # The inside of the statistics section
+    out.write(STATS_PANEL_HEADER.format(
+        total_words=stats.get('total_words', 0),
+        unique_words=stats.get('unique_words', 0),
+        total_sentences=stats.get('total_sentences', 0),
+        total_books=stats.get('total_books', 0),
+        avg_word_length=stats.get('avg_word_length', 0),
+        avg_words_per_sentence=stats.get('avg_words_per_sentence', 0),
+    ))
+
+    write_stat_sections(out, [
+        ('Place Mentions',
+         [(place.title(), count) for place, count in stats.get('place_mentions', [])[:25]]),
+        ('Character Mentions',
+         [(name.title(), count) for name, count in stats.get('character_mentions', [])[:15]]),
+        ('Longest Words',
+         [(word.title(), f'{len(word)} letters') for word in stats.get('longest_words', [])[:15]]),
+        ('Most Common Stop Words',
+         [(word.title(), count) for word, count in stats.get('most_common_stop_words', [])[:15]]),
+    ])
+    write_timeline_sections(out, stats)
+    write_length_sections(out, stats)
+    write_distinctive_terms_section(out, stats)
+
+    out.write(STATS_PANEL_END)
+
+def write_navigation(out, lines, search_url=None):
+    # Find all books and add to navigation
+    for line in lines:
+        match = BOOK_PATTERN.match(line.strip())
+        if match:
+            out.write(NAV_OPTION.format(match.group(1)))
+
+    out.write(SELECT_END)
+    if search_url:
+        out.write(SEARCH_BOX.format(html.escape(search_url)))
+    out.write(NAV_END)
+
+def write_page_start(out, lines, search_url=None):
+    # The head of the page and the navigation, up to the text
+    out.write(PAGE_HEAD_START)
+    if search_url:
+        out.write(SEARCH_STYLE)
+    out.write(PAGE_HEAD_END)
+    write_navigation(out, lines, search_url)
+
+def write_book_section(out, book_num, book_lines):
+    out.write(BOOK_SECTION_OPEN.format(book_num))
+    write_book(out, book_num, book_lines)
+    out.write(BOOK_END)
+
+def write_page_end(out, stats, search_url=None):
+    # Everything after the text: the statistics panel and the scripts
+    out.write(CONTENT_CLOSE)
+
+    # Add statistics section if stats are available
+    if stats:
+        out.write(STATISTICS_OPEN)
+        write_stats_panel(out, stats)
+        out.write(STATISTICS_CLOSE)
+
+    out.write(PAGE_FOOTER)
+    out.write(PAGE_SCRIPT)
+    if search_url:
+        out.write(SEARCH_SCRIPT)
+    out.write(PAGE_END)
+
+def write_odyssey_html(out, lines, stats, search_url=None):
+    # Stream the page to out chunk by chunk; lines is iterated twice (once
+    # for the navigation, once for the text), so it must be re-iterable.
+    # search_url points at the search index asset; without it the page has
+    # no search box.
+    write_page_start(out, lines, search_url)
+
+    for book_num, book_lines in split_books(lines):
+        if book_num:
+            write_book_section(out, book_num, book_lines)
+        else:
+            for line in book_lines:
+                write_content_line(out, line)
+
+    write_page_end(out, stats, search_url)
+
+def render_odyssey_html_split(lines, stats, search_url=None):
+    # Render the shell page plus a book-<N>.<hash>.html fragment for every
+    # book and stats.<hash>.html for the statistics panel. The content hash
+    # in the fragment names lets them be cached forever; only the shell
+    # needs revalidating. Returns (shell text, [(fragment name, bytes)]).
+    fragments = []
+
+    def render_fragment(name, write, *args):
+        fragment = io.StringIO()
+        write(fragment, *args)
+        data = fragment.getvalue().encode('utf-8')
+        name = hashed_name(name, data)
+        fragments.append((name, data))
+        return name
+
+    out = io.StringIO()
+    out.write(PAGE_HEAD_START)
+    out.write(SPLIT_STYLE)
+    if search_url:
+        out.write(SEARCH_STYLE)
+    out.write(PAGE_HEAD_END)
+    write_navigation(out, lines, search_url)
+
+    for book_num, book_lines in split_books(lines):
+        if book_num:
+            fragment = render_fragment(f'book-{book_num}.html', write_book, book_num, book_lines)
+            out.write(BOOK_PLACEHOLDER.format(book_num, fragment))
+        else:
+            for line in book_lines:
+                write_content_line(out, line)
+
+    out.write(CONTENT_CLOSE)
+
+    if stats:
+        fragment = render_fragment('stats.html', write_stats_panel, stats)
+        out.write(STATISTICS_PLACEHOLDER.format(fragment))
+
+    out.write(PAGE_FOOTER)
+    out.write(PAGE_SCRIPT)
+    out.write(SPLIT_SCRIPT)
+    if search_url:
+        out.write(SEARCH_SCRIPT)
+    out.write(PAGE_END)
+    return out.getvalue(), fragments
+
+def remove_stale_fragments(output_dir, current):
+    # Drop fragments (and their compressed copies) left over from older
+    # builds; current is the set of fragment names just written
+    for name in os.listdir(output_dir):
+        match = FRAGMENT_FILE_PATTERN.match(name)
+        if match and match.group(1) not in current:
+            os.remove(os.path.join(output_dir, name))
+
+def write_odyssey_html_split(output_dir, lines, stats, search_url=None):
+    # Write index.html and its fragments into output_dir (see
+    # render_odyssey_html_split). Returns the files written, shell first.
+    os.makedirs(output_dir, exist_ok=True)
+    shell, fragments = render_odyssey_html_split(lines, stats, search_url)
+
+    shell_file = os.path.join(output_dir, 'index.html')
+    written = [shell_file]
+    with phase('write'):
+        for name, data in fragments:
+            path = os.path.join(output_dir, name)
+            write_bytes(path, data)
+            written.append(path)
+        with open(shell_file, 'w', encoding='utf-8') as out:
+            out.write(shell)
+
+    remove_stale_fragments(output_dir, {name for name, _ in fragments})
+    return written
+
+def render_odyssey_html(lines, stats, search_url=None):
+    out = io.StringIO()
+    write_odyssey_html(out, lines, stats, search_url)
+    return out.getvalue()
+
+def fragment_manifest_file(output_file):
+    # odyssey_final.html -> odyssey_final.fragments.json
+    return os.path.splitext(output_file)[0] + '.fragments.json'
+
+def book_key(book_num, book_lines):
+    # Identifies the text of one book section
+    digest = hashlib.sha256(book_num.encode('utf-8'))
+    for line in book_lines:
+        digest.update(b'\n' + line.encode('utf-8'))
+    return digest.hexdigest()
+
+def read_matching(path, digest):
+    # The file's bytes if their sha256 is digest, else None
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return data if hashlib.sha256(data).hexdigest() == digest else None
+
+def load_fragment_cache(manifest_file, output_file):
+    # ({book key: (section bytes, deflated bytes)}, {search index piece key:
+    # deflated bytes}) from the previous build. The manifest records where
+    # each book section sits in the page and in its .gz, and where each piece
+    # of the search index sits in the index's .gz, so those files themselves
+    # are the cache. A missing or outdated manifest or a change to this
+    # renderer leaves both caches empty; a page, index or .gz changed since
+    # empties the cache drawn from it.
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+    if manifest.get('renderer') != file_hash(__file__):
+        return {}, {}
+
+    books = {}
+    page = read_matching(output_file, manifest.get('page_hash'))
+    compressed = read_matching(output_file + '.gz', manifest.get('gzip_hash'))
+    if page is not None and compressed is not None:
+        books = {
+            key: (page[start:start + length], compressed[gzip_start:gzip_start + gzip_length])
+            for key, (start, length, gzip_start, gzip_length) in manifest.get('books', {}).items()
+        }
+
+    search = {}
+    compressed = read_matching(search_index_file(output_file) + '.gz', manifest.get('search_gzip_hash'))
+    if compressed is not None:
+        search = {
+            key: compressed[gzip_start:gzip_start + gzip_length]
+            for key, (gzip_start, gzip_length) in manifest.get('search', {}).items()
+        }
+    return books, search
+
+def splice_gzip(pieces):
+    # (data, gzip copy, [(start, length, gzip start, gzip length)]) for a
+    # file made of pieces given as (bytes, deflate_piece output) pairs
+    ranges = []
+    position = 0
+    gzip_position = len(GZIP_HEADER)
+    for data, deflated in pieces:
+        ranges.append((position, len(data), gzip_position, len(deflated)))
+        position += len(data)
+        gzip_position += len(deflated)
+
+    data = b''.join(data for data, _ in pieces)
+    return data, gzip_from_pieces([deflated for _, deflated in pieces], data), ranges
+
+def render_odyssey_html_incremental(lines, stats, search_url, cache):
+    # The page and its gzip copy, assembled from pieces: the page start, one
+    # piece per book section and the page end. Book sections found in cache
+    # (see load_fragment_cache) are spliced in as they are, already
+    # compressed; only the others are rendered and deflated. Returns (page,
+    # compressed page, {book key: byte ranges} for the manifest, number of
+    # books rendered, number of books).
+    def fresh_piece(key, text):
+        data = text.encode('utf-8')
+        return key, data, deflate_piece(data)
+
+    start = io.StringIO()
+    write_page_start(start, lines, search_url)
+    book_pieces = []
+    rendered = 0
+
+    for book_num, book_lines in split_books(lines):
+        if not book_num:
+            # Text before the first BOOK only ever comes first
+            for line in book_lines:
+                write_content_line(start, line)
+            continue
+
+        key = book_key(book_num, book_lines)
+        if key in cache:
+            book_pieces.append((key, *cache[key]))
+        else:
+            section = io.StringIO()
+            write_book_section(section, book_num, book_lines)
+            book_pieces.append(fresh_piece(key, section.getvalue()))
+            rendered += 1
+
+    end = io.StringIO()
+    write_page_end(end, stats, search_url)
+    pieces = [fresh_piece(None, start.getvalue())] + book_pieces + [fresh_piece(None, end.getvalue())]
+
+    page, compressed, ranges = splice_gzip([(data, deflated) for _, data, deflated in pieces])
+    books = {key: list(piece_range) for (key, _, _), piece_range in zip(pieces, ranges) if key is not None}
+    return page, compressed, books, rendered, len(books)
+
+def write_search_index_incremental(lines, index_file, cache):
+    # Write the index asset and its .gz, deflating only the pieces of the
+    # index (see search_index_pieces) not found in cache. Returns (URL,
+    # {piece key: gzip byte range} for the manifest, index .gz).
+    with phase('search_index'):
+        pieces = [piece.encode('utf-8') for piece in search_index_pieces(build_search_index(lines))]
+    with phase('compress'):
+        keys = [hashlib.sha256(piece).hexdigest() for piece in pieces]
+        data, compressed, ranges = splice_gzip([
+            (piece, cache[key] if key in cache else deflate_piece(piece))
+            for key, piece in zip(keys, pieces)
+        ])
+    with phase('write'):
+        write_bytes(index_file, data)
+        write_bytes(index_file + '.gz', compressed)
+        remove_brotli(index_file)
+
+    search = {key: [gzip_start, gzip_length] for key, (_, _, gzip_start, gzip_length) in zip(keys, ranges)}
+    return search_index_url(index_file, data.decode('utf-8')), search, compressed
+
+def write_odyssey_html_incremental(output_file, lines, stats, manifest_file):
+    # Write the page, the search index and their .gz copies, re-rendering
+    # only the book sections whose text changed since the build recorded in
+    # manifest_file and deflating only the index pieces that changed. Brotli
+    # streams cannot be spliced from pieces, and a quality-11 pass over the
+    # whole page costs more than everything else here, so no .br is written
+    # (any old one is removed) and the server falls back to the .gz. This is
+    # for quick previews while editing; the default full build writes the
+    # .br. Returns (books rendered, books).
+    with phase('load_fragments'):
+        cache, search_cache = load_fragment_cache(manifest_file, output_file)
+    search_url, search, search_compressed = write_search_index_incremental(
+        lines, search_index_file(output_file), search_cache)
+    with phase('render'):
+        page, compressed, books, rendered, total = render_odyssey_html_incremental(lines, stats, search_url, cache)
+
+    with phase('write'):
+        write_bytes(output_file, page)
+        write_bytes(output_file + '.gz', compressed)
+        remove_brotli(output_file)
+
+    with phase('save_fragments'):
+        temp_file = manifest_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'renderer': file_hash(__file__),
+                'page_hash': hashlib.sha256(page).hexdigest(),
+                'gzip_hash': hashlib.sha256(compressed).hexdigest(),
+                'books': books,
+                'search_gzip_hash': hashlib.sha256(search_compressed).hexdigest(),
+                'search': search,
+            }, f)
+        os.replace(temp_file, manifest_file)
+    return rendered, total
+
+# Average number of words in each separately compressed run of the search index
+SEARCH_PIECE_WORDS = 64
+
+def build_search_index(lines):
+    # Inverted index from each word to the paragraphs containing it.
+    # Paragraphs are numbered across the whole text in page order (every
+    # subtitle, footnote and paragraph of a book counts as one), so each
+    # posting list is ascending and is stored as gaps between numbers.
+    # starts[i] is the number of the first paragraph of books[i], which lets
+    # the page map a number back to (book, paragraph within the book).
+    postings = {}
+    books = []
+    starts = []
+    paragraph = 0
+
+    for book_num, book_lines in split_books(lines):
+        # Text before the first BOOK has no section to jump to
+        if not book_num:
+            continue
+        books.append(book_num)
+        starts.append(paragraph)
+        for line in book_lines:
+            for word in set(WORD_PATTERN.findall(html.unescape(line).lower())):
+                postings.setdefault(word, []).append(paragraph)
+            paragraph += 1
+
+    words = sorted(postings)
+    return {
+        'books': books,
+        'starts': starts,
+        'words': words,
+        'postings': [
+            [number - previous for previous, number in zip([0] + numbers, numbers)]
+            for numbers in (postings[word] for word in words)
+        ],
+    }
+
+def render_search_index(lines):
+    return json.dumps(build_search_index(lines), separators=(',', ':'))
+
+def search_index_pieces(index):
+    # The text of render_search_index cut into pieces that can be compressed
+    # separately: the book table, then runs of words and runs of their
+    # posting lists. A run starts at every word whose hash is a multiple of
+    # SEARCH_PIECE_WORDS, so where the runs are cut depends only on the words
+    # themselves; an edit changes just the runs holding the words it adds or
+    # removes, plus the posting lists whose gaps it shifts.
+    dump = lambda value: json.dumps(value, separators=(',', ':'))
+    words = index['words']
+    cuts = [
+        i for i, word in enumerate(words)
+        if i == 0 or zlib.crc32(word.encode('utf-8')) % SEARCH_PIECE_WORDS == 0
+    ] + [len(words)]
+
+    pieces = [f'{{"books":{dump(index["books"])},"starts":{dump(index["starts"])},"words":[']
+    for values, end in ((words, '],"postings":['), (index['postings'], ']}')):
+        for first, last in zip(cuts, cuts[1:]):
+            pieces.append((',' if first else '') + dump(values[first:last])[1:-1])
+        pieces.append(end)
+    return pieces
+
+def search_index_file(output_file):
+    # odyssey_final.html -> odyssey_final.search.json
+    return os.path.splitext(output_file)[0] + '.search.json'
+
+def search_index_url(index_file, index_text):
+    # Relative URL with a content version, so a changed index is never served
+    # from a stale cache
+    return f"{os.path.basename(index_file)}?v={content_hash(index_text.encode('utf-8'))}"
+
+def write_search_index(lines, index_file):
+    # Write the index asset (plus compressed copies); returns its URL
+    with phase('search_index'):
+        index_text = render_search_index(lines)
+        write_bytes(index_file, index_text.encode('utf-8'))
+    with phase('compress'):
+        compress_files([index_file])
+    return search_index_url(index_file, index_text)
+
+def create_odyssey_html(input_file, output_file, cache_file=DEFAULT_CACHE_FILE, stats=None, fragment_manifest=None):
+    with phase('read'):
+        with open(input_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+
+    # Reuse cached statistics for this exact text, analyzing it if needed,
+    # unless the caller already has them
+    if stats is None:
+        with phase('stats'):
+            stats = load_or_compute_stats(input_file, cache_file)
+
+    # With a fragment manifest, only the books whose text changed are
+    # rendered and compressed again
+    if fragment_manifest:
+        rendered, books = write_odyssey_html_incremental(output_file, lines, stats, fragment_manifest)
+        print(f"HTML page created: {output_file} ({rendered} of {books} books re-rendered)")
+        return
+
+    search_url = write_search_index(lines, search_index_file(output_file))
+
+    # 'render' is the markup generation alone; the time spent handing the
+    # chunks to the file is recorded as 'write'
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 16) as f, \
+            phase('render'), timed_writes(f) as out:
+        write_odyssey_html(out, lines, stats, search_url)
+    with phase('compress'):
+        compress_files([output_file])
 
     print(f"HTML page created: {output_file}")
 
+def create_odyssey_html_split(input_file, output_dir, cache_file=DEFAULT_CACHE_FILE):
+    with phase('read'):
+        with open(input_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+
+    with phase('stats'):
+        stats = load_or_compute_stats(input_file, cache_file)
+    os.makedirs(output_dir, exist_ok=True)
+    search_url = write_search_index(lines, search_index_file(os.path.join(output_dir, 'index.html')))
+    with phase('render'):
+        written = write_odyssey_html_split(output_dir, lines, stats, search_url)
+    with phase('compress'):
+        # A content-hashed fragment never changes under its name, so one that
+        # already has a compressed copy is left alone
+        compress_files([path for path in written
+                        if not (is_hashed_name(os.path.basename(path)) and os.path.exists(path + '.gz'))])
+
+    print(f"HTML shell page created: {written[0]}")
+    print(f"Fragments written: {len(written) - 1} files in {output_dir}")
+
 if __name__ == "__main__":
-    create_odyssey_html("odyssey_formatted.txt", "odyssey_final.html")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the styled HTML edition of the Odyssey")
+    parser.add_argument('input_file', nargs='?', default="odyssey_formatted.txt")
+    parser.add_argument('output_file', nargs='?', default="odyssey_final.html")
+    parser.add_argument('--split', metavar='DIR',
+                        help="write a shell page plus per-book fragments loaded on demand into DIR")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only re-render and recompress what changed since the last --incremental "
+                             "run; writes .gz copies but no .br")
+    parser.add_argument('--fragment-manifest', metavar='FILE',
+                        help="sidecar for --incremental recording where each book and index piece sits "
+                             "(default: <output>.fragments.json)")
+    add_profile_arguments(parser, 'final_html')
+    args = parser.parse_args()
+
+    fragment_manifest = None
+    if args.incremental:
+        fragment_manifest = args.fragment_manifest or fragment_manifest_file(args.output_file)
+
+    if args.split:
+        outputs = [args.split]
+    else:
+        outputs = [path + suffix for path in (args.output_file, search_index_file(args.output_file))
+                   for suffix in ('', '.gz', '.br')]
+    with profile_stage('final_html', args.profile, args.cprofile, inputs=[args.input_file], outputs=outputs):
+        if args.split:
+            create_odyssey_html_split(args.input_file, args.split)
+        else:
+            create_odyssey_html(args.input_file, args.output_file, fragment_manifest=fragment_manifest)
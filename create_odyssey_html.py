@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
+import argparse
 import html
-import re
+import io
 
-def create_html_page(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+from instrumentation import add_profile_arguments, phase, profile_stage, timed_writes
+from precompress import compress_files
 
-    html_content = """<!DOCTYPE html>
+# Page template: static chunks written around the generated text content
+PAGE_HEAD = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -204,31 +205,10 @@ def create_html_page(input_file, output_file):
             <div class="text-content">
 """
 
-    is_first_content_line = True
-    in_book_section = False
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        line = html.escape(line)
+CHAPTER_MARKER = '<span class="chapter-marker">{}</span>\n'
+PARAGRAPH = '<p>{}</p>\n'
 
-        if "BOOK" in line.upper() and len(line) < 50:
-            html_content += f'<span class="chapter-marker">{line}</span>\n'
-            in_book_section = True
-            is_first_content_line = True
-        elif "Project Gutenberg" in line or "Title:" in line or "Author:" in line or "Translator:" in line:
-            if not in_book_section:
-                html_content += f'<p>{line}</p>\n'
-        else:
-            if is_first_content_line and in_book_section:
-                html_content += f'<p>{line}</p>\n'
-                is_first_content_line = False
-            else:
-                html_content += f'<p>{line}</p>\n'
-
-    html_content += """
+PAGE_TAIL = """
             </div>
         </div>
 
@@ -258,10 +238,53 @@ def create_html_page(input_file, output_file):
 </body>
 </html>"""
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+def write_html_page(out, lines):
+    # Stream the page to out chunk by chunk
+    out.write(PAGE_HEAD)
+
+    in_book_section = False
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        line = html.escape(line)
+
+        if "BOOK" in line.upper() and len(line) < 50:
+            out.write(CHAPTER_MARKER.format(line))
+            in_book_section = True
+        elif "Project Gutenberg" in line or "Title:" in line or "Author:" in line or "Translator:" in line:
+            if not in_book_section:
+                out.write(PARAGRAPH.format(line))
+        else:
+            out.write(PARAGRAPH.format(line))
+
+    out.write(PAGE_TAIL)
+
+def render_html_page(lines):
+    out = io.StringIO()
+    write_html_page(out, lines)
+    return out.getvalue()
+
+def create_html_page(input_file, output_file):
+    # Lines are read as they are rendered, so 'render' includes reading
+    with open(input_file, 'r', encoding='utf-8') as f, \
+            open(output_file, 'w', encoding='utf-8', buffering=1 << 16) as out, \
+            phase('render'), timed_writes(out) as timed:
+        write_html_page(timed, f)
+    with phase('compress'):
+        compress_files([output_file])
 
     print(f"HTML page created successfully: {output_file}")
 
 if __name__ == "__main__":
-    create_html_page("Odyssey_formatted.txt", "odyssey.html")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the alternative HTML page from the comma-split text")
+    parser.add_argument('input_file', nargs='?', default="Odyssey_formatted.txt")
+    parser.add_argument('output_file', nargs='?', default="odyssey.html")
+    add_profile_arguments(parser, 'alt_html')
+    args = parser.parse_args()
+
+    outputs = [args.output_file + suffix for suffix in ('', '.gz', '.br')]
+    with profile_stage('alt_html', args.profile, args.cprofile, inputs=[args.input_file], outputs=outputs):
+        create_html_page(args.input_file, args.output_file)
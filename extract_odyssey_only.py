@@ -1,19 +1,78 @@
 #!/usr/bin/env python3
+import argparse
+import os
 
-def extract_odyssey_text(input_file, output_file):
+from instrumentation import add_profile_arguments, phase, profile_stage
+
+START_MARKER = "BOOK I"
+END_MARKER = "*** END OF THE PROJECT GUTENBERG EBOOK"
+
+def select_odyssey_lines(lines):
+    # Yield the Odyssey lines from any line iterable, one at a time.
+    # Raises ValueError once exhausted if either boundary was never found, so
+    # consumers can tell a truncated stream from a complete one.
+    started = False
+
+    for line in lines:
+        if not started and line.strip() == START_MARKER:
+            started = True
+
+        if END_MARKER in line:
+            if started:
+                return
+            break
+
+        if started:
+            yield line
+
+    raise ValueError("Could not find proper boundaries")
+
+def iter_odyssey_lines(input_file):
+    # Stream the Odyssey lines of a file without holding it in memory
     with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+        yield from select_odyssey_lines(f)
+
+def extract_odyssey_text_streaming(input_file, output_file):
+    # Write through a temporary file so a missing end marker never leaves a
+    # half-written output behind, matching the all-or-nothing batch mode.
+    temp_file = output_file + '.tmp'
+    line_count = 0
+
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f, phase('stream'):
+            for line in iter_odyssey_lines(input_file):
+                f.write(line)
+                line_count += 1
+    except ValueError:
+        os.remove(temp_file)
+        print("Could not find proper boundaries")
+        return
+
+    os.replace(temp_file, output_file)
+
+    print(f"Output saved to {output_file}")
+    print(f"Cleaned file: {line_count} lines")
+
+def extract_odyssey_text(input_file, output_file, streaming=False):
+    if streaming:
+        extract_odyssey_text_streaming(input_file, output_file)
+        return
+
+    with phase('read'):
+        with open(input_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
 
     start_line = None
     end_line = None
 
-    for i, line in enumerate(lines):
-        if line.strip() == "BOOK I" and start_line is None:
-            start_line = i
+    with phase('find_markers'):
+        for i, line in enumerate(lines):
+            if line.strip() == START_MARKER and start_line is None:
+                start_line = i
 
-        if "*** END OF THE PROJECT GUTENBERG EBOOK" in line:
-            end_line = i
-            break
+            if END_MARKER in line:
+                end_line = i
+                break
 
     if start_line is None or end_line is None:
         print("Could not find proper boundaries")
@@ -21,9 +80,10 @@ def extract_odyssey_text(input_file, output_file):
 
     odyssey_content = lines[start_line:end_line]
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for line in odyssey_content:
-            f.write(line)
+    with phase('write'):
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for line in odyssey_content:
+                f.write(line)
 
     print(f"Extracted Odyssey text from line {start_line} to line {end_line}")
     print(f"Output saved to {output_file}")
@@ -31,4 +91,14 @@ def extract_odyssey_text(input_file, output_file):
     print(f"Cleaned file: {len(odyssey_content)} lines")
 
 if __name__ == "__main__":
-    extract_odyssey_text("raw_Odyssey.txt", "odyssey_clean.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Strip Project Gutenberg front and end matter")
+    parser.add_argument('input_file', nargs='?', default="raw_Odyssey.txt")
+    parser.add_argument('output_file', nargs='?', default="odyssey_clean.txt")
+    parser.add_argument('--stream', action='store_true',
+                        help="scan line by line with constant memory")
+    add_profile_arguments(parser, 'extract')
+    args = parser.parse_args()
+
+    with profile_stage('extract', args.profile, args.cprofile,
+                       inputs=[args.input_file], outputs=[args.output_file]):
+        extract_odyssey_text(args.input_file, args.output_file, streaming=args.stream)
@@ -1,16 +1,25 @@
 #!/usr/bin/env python3
+import argparse
 import re
 
-def format_odyssey_text(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+from instrumentation import add_profile_arguments, phase, profile_stage, timed_writes
+
+BOOK_LINE_PATTERN = re.compile(r'^BOOK [IVXLCDM]+$')
+SPACE_RUN_PATTERN = re.compile(r'  +')
+QUOTE_AFTER_PATTERN = re.compile(r'"\s+')
+QUOTE_BEFORE_PATTERN = re.compile(r'\s+"')
 
-    formatted_lines = []
+def iter_paragraphs(lines, counts=None):
+    # State machine over the cleaned lines that yields every output line as
+    # soon as it is finished: a joined paragraph, a BOOK header, a subtitle
+    # or a footnote line, with '' for each blank line. Only the paragraph
+    # being joined is held in memory.
     current_paragraph = []
     in_footnote = False
-    consecutive_empty_lines = 0
 
-    for i, line in enumerate(lines):
+    for line in lines:
+        if counts is not None:
+            counts['input_lines'] += 1
         stripped = line.strip()
 
         # Check if this is a footnote (starts with [ and contains ])
@@ -18,20 +27,18 @@ def format_odyssey_text(input_file, output_file):
             in_footnote = True
 
         # Check if this is a BOOK header
-        if re.match(r'^BOOK [IVXLCDM]+$', stripped):
+        if BOOK_LINE_PATTERN.match(stripped):
             # Flush current paragraph
             if current_paragraph:
-                formatted_lines.append(' '.join(current_paragraph))
-                formatted_lines.append('')
+                yield ' '.join(current_paragraph)
+                yield ''
                 current_paragraph = []
 
-            # Add book header with proper spacing
-            if formatted_lines and formatted_lines[-1] != '':
-                formatted_lines.append('')
-            formatted_lines.append('')
-            formatted_lines.append(stripped)
-            formatted_lines.append('')
-            consecutive_empty_lines = 0
+            # Blank line before the header. Runs of blank lines between text
+            # come out as a single blank line, so one is always enough.
+            yield ''
+            yield stripped
+            yield ''
             continue
 
         # Check if this is a chapter subtitle (all caps, multiple words)
@@ -42,71 +49,106 @@ def format_odyssey_text(input_file, output_file):
             len(stripped) < 100):
             # Flush current paragraph
             if current_paragraph:
-                formatted_lines.append(' '.join(current_paragraph))
-                formatted_lines.append('')
+                yield ' '.join(current_paragraph)
+                yield ''
                 current_paragraph = []
 
-            formatted_lines.append(stripped)
-            formatted_lines.append('')
-            consecutive_empty_lines = 0
+            yield stripped
+            yield ''
             continue
 
-        # Handle empty lines
         if not stripped:
+            # End of paragraph - join lines and yield; further empty lines
+            # add nothing
             if current_paragraph:
-                # End of paragraph - join lines and add
-                formatted_lines.append(' '.join(current_paragraph))
-                formatted_lines.append('')
+                yield ' '.join(current_paragraph)
+                yield ''
                 current_paragraph = []
-                consecutive_empty_lines = 1
-            else:
-                # Multiple empty lines - keep only one
-                consecutive_empty_lines += 1
-                if consecutive_empty_lines <= 2:
-                    continue
-        else:
-            consecutive_empty_lines = 0
-
+        elif in_footnote:
             # Handle footnotes - keep them as separate lines
-            if in_footnote:
-                if current_paragraph:
-                    formatted_lines.append(' '.join(current_paragraph))
-                    current_paragraph = []
-                formatted_lines.append(stripped)
-                if stripped.endswith(']'):
-                    in_footnote = False
-                    formatted_lines.append('')
-            else:
-                # Regular text - add to current paragraph
-                current_paragraph.append(stripped)
+            if current_paragraph:
+                yield ' '.join(current_paragraph)
+                current_paragraph = []
+            yield stripped
+            if stripped.endswith(']'):
+                in_footnote = False
+                yield ''
+        else:
+            # Regular text - add to current paragraph
+            current_paragraph.append(stripped)
 
     # Don't forget the last paragraph
     if current_paragraph:
-        formatted_lines.append(' '.join(current_paragraph))
+        yield ' '.join(current_paragraph)
+
+def clean_line(line):
+    # Replace multiple spaces with single space, then fix spacing around
+    # quotation marks
+    if '  ' in line:
+        line = SPACE_RUN_PATTERN.sub(' ', line)
+    if '"' in line:
+        line = QUOTE_AFTER_PATTERN.sub('"', line)
+        line = QUOTE_BEFORE_PATTERN.sub('"', line)
+    return line
+
+def iter_formatted_text(lines, counts=None):
+    # Yield the formatted text piece by piece. The cleanups are applied to
+    # one output line at a time, plus a rule for the newlines between lines:
+    # at most one blank line in a row, and no line break at all next to a
+    # quotation mark. Output lines never start or end with whitespace, so
+    # this gives the same text as joining all the lines and running the
+    # cleanup regexes over the whole thing. Blank lines at the end are
+    # dropped.
+    previous = None
+    blank_lines = 0
+
+    for line in iter_paragraphs(lines, counts):
+        if not line:
+            blank_lines += 1
+            continue
 
-    # Clean up excessive empty lines at the end
-    while formatted_lines and formatted_lines[-1] == '':
-        formatted_lines.pop()
+        line = clean_line(line)
+        if previous is None:
+            newlines = min(blank_lines, 2)
+        else:
+            newlines = 2 if blank_lines else 1
+        if line.startswith('"') or (previous is not None and previous.endswith('"')):
+            newlines = 0
 
-    # Join the lines and do final cleanup
-    formatted_text = '\n'.join(formatted_lines)
+        if newlines:
+            yield '\n' * newlines
+        yield line
 
-    # Replace multiple spaces with single space
-    formatted_text = re.sub(r'  +', ' ', formatted_text)
+        if counts is not None:
+            counts['output_lines'] += newlines + (previous is None)
+        previous = line
+        blank_lines = 0
 
-    # Ensure no more than 2 consecutive newlines
-    formatted_text = re.sub(r'\n{3,}', '\n\n', formatted_text)
+def format_odyssey_lines(lines):
+    return ''.join(iter_formatted_text(lines))
 
-    # Fix spacing around quotation marks
-    formatted_text = re.sub(r'"\s+', '"', formatted_text)
-    formatted_text = re.sub(r'\s+"', '"', formatted_text)
+def format_odyssey_text(input_file, output_file):
+    # Stream from input to output; memory is bounded by the longest paragraph
+    counts = {'input_lines': 0, 'output_lines': 0}
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(formatted_text)
+    # 'format' is the reflow and cleanup (including reading the input)
+    with open(input_file, 'r', encoding='utf-8') as f, \
+            open(output_file, 'w', encoding='utf-8', buffering=1 << 16) as out, \
+            phase('format'), timed_writes(out) as timed:
+        for piece in iter_formatted_text(f, counts):
+            timed.write(piece)
 
     print(f"Formatted text saved to {output_file}")
-    print(f"Original: {len(lines)} lines")
-    print(f"Formatted: {len(formatted_text.splitlines())} lines")
+    print(f"Original: {counts['input_lines']} lines")
+    print(f"Formatted: {counts['output_lines']} lines")
 
 if __name__ == "__main__":
-    format_odyssey_text("odyssey_clean.txt", "odyssey_formatted.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reflow the cleaned text into one line per paragraph")
+    parser.add_argument('input_file', nargs='?', default="odyssey_clean.txt")
+    parser.add_argument('output_file', nargs='?', default="odyssey_formatted.txt")
+    add_profile_arguments(parser, 'format')
+    args = parser.parse_args()
+
+    with profile_stage('format', args.profile, args.cprofile,
+                       inputs=[args.input_file], outputs=[args.output_file]):
+        format_odyssey_text(args.input_file, args.output_file)
\ No newline at end of file
@@ -0,0 +1,188 @@
+# Optional per-stage profiling shared by the pipeline scripts. Each script
+# takes --profile [FILE] (a JSON report of wall and CPU time, peak memory,
+# bytes read and written and named sub-phase timings) and --cprofile [FILE]
+# (a cProfile dump for pstats or snakeviz). Setting ODYSSEY_PROFILE or
+# ODYSSEY_CPROFILE to a directory does the same for every stage run while it
+# is set, writing <stage>.profile.json / <stage>.prof there.
+#
+# Code marks its sub-phases with `with phase('name'):`. Outside a profiled
+# stage that is a no-op, so library callers pay nothing.
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILE_ENV = 'ODYSSEY_PROFILE'
+CPROFILE_ENV = 'ODYSSEY_CPROFILE'
+
+# The profile of the stage running in this process, or None
+current_profile = None
+
+def peak_memory_mb(children=False):
+    # Peak RSS of this process, or of its largest waited-for child process
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def cpu_seconds():
+    # User plus system time of this process and its finished children
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def path_size(path):
+    # Bytes in a file, or in all files under a directory
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    if os.path.exists(path):
+        return os.path.getsize(path)
+    return 0
+
+def add_profile_arguments(parser, stage):
+    parser.add_argument('--profile', nargs='?', const=f'{stage}.profile.json', metavar='FILE',
+                        help=f"write timings, memory and I/O as JSON (default: {stage}.profile.json; "
+                             f"or set {PROFILE_ENV}=DIR)")
+    parser.add_argument('--cprofile', nargs='?', const=f'{stage}.prof', metavar='FILE',
+                        help=f"also dump a cProfile of the stage (default: {stage}.prof; "
+                             f"or set {CPROFILE_ENV}=DIR)")
+
+def env_output(variable, file_name):
+    directory = os.environ.get(variable)
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, file_name)
+
+def record_phase(name, seconds, calls=1):
+    # Add time spent in a sub-phase. Time recorded inside another phase is
+    # taken out of that phase, so phases add up to at most the stage's time.
+    phases = current_profile['phases']
+    entry = phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+    entry['seconds'] += seconds
+    entry['calls'] += calls
+    if current_profile['open']:
+        current_profile['open'][-1] += seconds
+
+@contextlib.contextmanager
+def phase(name):
+    if current_profile is None:
+        yield
+        return
+    current_profile['open'].append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = current_profile['open'].pop()
+        record_phase(name, elapsed - nested)
+        # record_phase charged the parent with this phase's own time; the
+        # phases nested in it count against the parent as well
+        if current_profile['open']:
+            current_profile['open'][-1] += nested
+
+class TimedWriter:
+    # Wraps a text stream so the time spent in write() is recorded as its
+    # own phase, apart from the rendering that produced the text
+    def __init__(self, out, name):
+        self.out = out
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+
+    def write(self, text):
+        start = time.perf_counter()
+        self.out.write(text)
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+
+    def flush_timing(self):
+        if self.calls:
+            record_phase(self.name, self.seconds, self.calls)
+        self.seconds = 0.0
+        self.calls = 0
+
+@contextlib.contextmanager
+def timed_writes(out, name='write'):
+    # Yields out itself when no stage is profiled
+    if current_profile is None:
+        yield out
+        return
+    writer = TimedWriter(out, name)
+    try:
+        yield writer
+    finally:
+        writer.flush_timing()
+
+def profile_report(profile, wall, cpu, bytes_read, outputs):
+    peaks = [peak for peak in (peak_memory_mb(), peak_memory_mb(children=True)) if peak is not None]
+    phases = {name: {'seconds': round(entry['seconds'], 6), 'calls': entry['calls']}
+              for name, entry in profile['phases'].items()}
+    return {
+        'stage': profile['stage'],
+        'argv': sys.argv,
+        'wall_seconds': round(wall, 6),
+        'cpu_seconds': round(cpu, 6),
+        'peak_memory_mb': round(max(peaks), 1) if peaks else None,
+        'bytes_read': bytes_read,
+        'bytes_written': sum(path_size(path) for path in outputs),
+        'phases': phases,
+        'unaccounted_seconds': round(wall - sum(entry['seconds'] for entry in phases.values()), 6),
+    }
+
+@contextlib.contextmanager
+def profile_stage(stage, profile_file=None, cprofile_file=None, inputs=(), outputs=()):
+    # Profile the body as one stage. inputs and outputs are the files (or
+    # directories) whose sizes are reported as bytes read and written; outputs
+    # are measured once the stage is done. A stage run inside another
+    # profiled stage (build.py running each step) becomes one of its phases.
+    global current_profile
+
+    if current_profile is not None:
+        with phase(stage):
+            yield
+        return
+
+    profile_file = profile_file or env_output(PROFILE_ENV, f'{stage}.profile.json')
+    cprofile_file = cprofile_file or env_output(CPROFILE_ENV, f'{stage}.prof')
+    if not profile_file and not cprofile_file:
+        yield
+        return
+
+    # Input sizes are taken up front, in case the stage rewrites them
+    bytes_read = sum(path_size(path) for path in inputs)
+    current_profile = {'stage': stage, 'phases': {}, 'open': []}
+    profiler = cProfile.Profile() if cprofile_file else None
+    start_cpu = cpu_seconds()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        wall = time.perf_counter() - start
+        cpu = cpu_seconds() - start_cpu
+        profile, current_profile = current_profile, None
+
+        if profiler:
+            profiler.dump_stats(cprofile_file)
+            print(f"cProfile written to {cprofile_file}")
+        if profile_file:
+            report = profile_report(profile, wall, cpu, bytes_read, outputs)
+            with open(profile_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"Profile written to {profile_file}")
@@ -0,0 +1,90 @@
+# What sets each book apart from the rest of the text: TF-IDF and keyness
+# (Dunning's log-likelihood of a term in one document against all the other
+# documents) over a sparse document x term count matrix. The matrix is kept
+# as coordinate arrays of its non-zero cells, so memory grows with the
+# number of distinct (document, term) pairs rather than with documents x
+# vocabulary, and a corpus of thousands of texts works the same way as the
+# 24 books of the Odyssey. NumPy is optional, as for ngram_stats.py.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ngram_stats import log_likelihood
+
+TOP_DISTINCTIVE_TERMS = 10
+
+# Terms used fewer times than this in a document are not reported for it
+MIN_DISTINCTIVE_COUNT = 3
+
+def document_term_counts(word_freqs, vocabulary):
+    # (rows, columns, counts) of the non-zero cells of the document x term
+    # matrix, from one Counter of words per document, with cells in (row,
+    # column) order. Columns follow the order of vocabulary.
+    word_ids = {word: i for i, word in enumerate(vocabulary)}
+    sizes = [len(word_freq) for word_freq in word_freqs]
+    rows = np.repeat(np.arange(len(word_freqs), dtype=np.int64), sizes)
+    columns = np.fromiter((word_ids[word] for word_freq in word_freqs for word in word_freq),
+                          dtype=np.int64, count=sum(sizes))
+    counts = np.fromiter((count for word_freq in word_freqs for count in word_freq.values()),
+                         dtype=np.int64, count=sum(sizes))
+    order = np.lexsort((columns, rows))
+    return rows[order], columns[order], counts[order]
+
+def term_weights(rows, columns, counts, document_count, vocabulary_size):
+    # (tf_idf, g2, overused) for every cell. overused marks the terms that
+    # are relatively more frequent in the document than in the rest, the
+    # only ones whose log-likelihood says something about the document.
+    counts = counts.astype(np.float64)
+    document_totals = np.bincount(rows, weights=counts, minlength=document_count)
+    term_totals = np.bincount(columns, weights=counts, minlength=vocabulary_size)
+    document_frequency = np.bincount(columns, minlength=vocabulary_size)
+    total = document_totals.sum()
+
+    in_document = document_totals[rows]
+    elsewhere = term_totals[columns] - counts
+    rest = total - in_document
+
+    tf_idf = counts / in_document * np.log(document_count / document_frequency[columns])
+    g2 = log_likelihood(counts, in_document - counts, elsewhere, rest - elsewhere)
+    overused = counts * rest > elsewhere * in_document
+    return tf_idf, g2, overused
+
+def top_per_document(rows, scores, counts, keep, limit):
+    # Indices of the `limit` highest-scoring kept cells of every document
+    # (ties broken by count), grouped by document and best first
+    candidates = np.flatnonzero(keep)
+    order = candidates[np.lexsort((-counts[candidates], -scores[candidates], rows[candidates]))]
+    grouped = rows[order]
+    rank = np.arange(len(order)) - np.searchsorted(grouped, grouped)
+    return order[rank < limit]
+
+def distinctive_terms(rows, columns, counts, document_names, vocabulary, stop_words,
+                      limit=TOP_DISTINCTIVE_TERMS):
+    # {document: {'log_likelihood': [[term, g2, count], ...],
+    #             'tf_idf': [[term, tf_idf, count], ...]}}
+    # for the content words each document uses at least MIN_DISTINCTIVE_COUNT
+    # times. Needs at least two documents to compare.
+    if len(document_names) < 2:
+        return {}
+
+    is_stop = np.array([word in stop_words for word in vocabulary], dtype=bool)
+    tf_idf, g2, overused = term_weights(rows, columns, counts, len(document_names), len(vocabulary))
+    content = ~is_stop[columns] & (counts >= MIN_DISTINCTIVE_COUNT)
+
+    terms = {name: {'log_likelihood': [], 'tf_idf': []} for name in document_names}
+    for key, scores, keep, digits in (('log_likelihood', g2, content & overused, 3),
+                                      ('tf_idf', tf_idf, content, 6)):
+        for i in top_per_document(rows, scores, counts, keep, limit):
+            terms[document_names[rows[i]]][key].append(
+                [vocabulary[columns[i]], round(float(scores[i]), digits), int(counts[i])])
+    return terms
+
+def book_keyness(book_word_freqs, vocabulary, stop_words):
+    # Distinctive terms of every book against the rest of the text, keyed for
+    # the per_book summaries (see analyze_odyssey_stats.add_token_stats).
+    # book_word_freqs maps each book to the Counter of its words.
+    books = [book for book, word_freq in book_word_freqs.items() if word_freq]
+    rows, columns, counts = document_term_counts([book_word_freqs[book] for book in books], vocabulary)
+    terms = distinctive_terms(rows, columns, counts, books, vocabulary, stop_words)
+    return {'per_book_distinctive_terms': {book: {'distinctive_terms': entry} for book, entry in terms.items()}}
@@ -0,0 +1,112 @@
+# Word-length and sentence-length distributions, computed with NumPy from
+# length histograms: for each book, how many words (or sentences) there are
+# of every length. The histograms add up across sections of the text, so
+# they are built per section and merged (see analyze_odyssey_stats) and the
+# text is never tokenized as a whole. Only called when NumPy is installed.
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+# Sentence lengths are binned into SENTENCE_BIN_WIDTH-word bins, with one
+# open-ended bin for sentences longer than SENTENCE_BIN_LIMIT words
+SENTENCE_BIN_WIDTH = 5
+SENTENCE_BIN_LIMIT = 100
+
+def sentence_lengths(word_total, sentence_ends):
+    # (starts, lengths) in words of every sentence that contains a word.
+    # A sentence runs from one run of sentence-ending punctuation to the
+    # next, across line and book breaks like the sentence count.
+    bounds = np.unique(np.concatenate(([0], np.asarray(sentence_ends, dtype=np.int64), [word_total])))
+    starts = bounds[:-1]
+    lengths = np.diff(bounds)
+    return starts, lengths
+
+def histogram_arrays(histogram):
+    # Counter {length: count} -> (lengths, counts), ascending by length
+    lengths = np.array(sorted(length for length, count in histogram.items() if count), dtype=np.int64)
+    counts = np.array([histogram[length] for length in lengths], dtype=np.int64)
+    return lengths, counts
+
+def histogram_percentiles(lengths, counts):
+    # np.percentile's linear interpolation over the sorted values the
+    # histogram stands for, without expanding them
+    total = counts.sum()
+    ranks = np.cumsum(counts)
+    positions = np.array(PERCENTILES) / 100 * (total - 1)
+    below = np.floor(positions)
+    lower = lengths[np.searchsorted(ranks, below, side='right')]
+    upper = lengths[np.searchsorted(ranks, np.ceil(positions), side='right')]
+    return lower + (upper - lower) * (positions - below)
+
+def describe(lengths, counts):
+    # Summary of a non-empty histogram
+    total = counts.sum()
+    mean = (lengths * counts).sum() / total
+    std = np.sqrt(((lengths - mean) ** 2 * counts).sum() / total)
+    return {
+        'mean': round(float(mean), 2),
+        'std': round(float(std), 2),
+        'min': int(lengths[0]),
+        'max': int(lengths[-1]),
+        'percentiles': {f'p{p}': round(float(q), 2)
+                        for p, q in zip(PERCENTILES, histogram_percentiles(lengths, counts))},
+    }
+
+def word_length_distribution(lengths, counts):
+    distribution = describe(lengths, counts)
+    distribution['histogram'] = [[int(length), int(count)] for length, count in zip(lengths, counts) if length]
+    return distribution
+
+def sentence_length_distribution(lengths, counts):
+    distribution = describe(lengths, counts)
+    edges = (list(range(1, SENTENCE_BIN_LIMIT + 1, SENTENCE_BIN_WIDTH))
+             + [SENTENCE_BIN_LIMIT + 1, max(int(lengths[-1]), SENTENCE_BIN_LIMIT + 1) + 1])
+    binned, _ = np.histogram(lengths, bins=edges, weights=counts)
+    labels = [f'{start}-{start + SENTENCE_BIN_WIDTH - 1}' for start in edges[:-2]] + [f'{SENTENCE_BIN_LIMIT + 1}+']
+    distribution['histogram'] = [[label, int(count)] for label, count in zip(labels, binned)]
+    return distribution
+
+def mean_variance(histogram):
+    # (count, mean, population variance) of a histogram
+    count = sum(histogram.values())
+    if not count:
+        return 0, 0.0, 0.0
+    total = sum(length * n for length, n in histogram.items())
+    squares = sum(length * length * n for length, n in histogram.items())
+    mean = total / count
+    return count, mean, max(squares / count - mean ** 2, 0)
+
+def length_statistics(word_lengths, sentence_lengths, book_names):
+    # word_lengths and sentence_lengths map each book (None for text before
+    # the first book) to a Counter of lengths; a sentence belongs to the
+    # book of its first word
+    all_words = sum(word_lengths.values(), Counter())
+    all_sentences = sum(sentence_lengths.values(), Counter())
+    if not all_words:
+        return {}
+
+    stats = {
+        'word_length_distribution': word_length_distribution(*histogram_arrays(all_words)),
+        'sentence_length_distribution': sentence_length_distribution(*histogram_arrays(all_sentences)),
+    }
+
+    per_book = {}
+    for book in book_names:
+        words, word_mean, word_variance = mean_variance(word_lengths.get(book, Counter()))
+        if not words:
+            continue
+        sentences, sentence_mean, sentence_variance = mean_variance(sentence_lengths.get(book, Counter()))
+        per_book[book] = {
+            'word_length_mean': round(word_mean, 2),
+            'word_length_variance': round(word_variance, 2),
+            'sentences': sentences,
+            'sentence_length_mean': round(sentence_mean, 2) if sentences else 0,
+            'sentence_length_variance': round(sentence_variance, 2) if sentences else 0,
+        }
+    stats['per_book_lengths'] = per_book
+    return stats
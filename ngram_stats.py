@@ -0,0 +1,192 @@
+# Bigram/trigram frequencies and bigram collocation scores, computed with
+# NumPy over integer token-ID arrays. Each section of the text is counted
+# on its own (add_section_ngrams) and the counts are summed by integer key,
+# so the text is never tokenized as a whole. NumPy is optional: without it
+# these statistics are skipped.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TOP_NGRAMS = 50
+TOP_COLLOCATIONS = 25
+
+# Bigrams seen fewer times than this are too rare for PMI to mean anything
+MIN_COLLOCATION_COUNT = 5
+
+def ngram_keys(ids, paragraphs, n, vocabulary_size):
+    # One integer per n-gram that stays inside a paragraph: the n token IDs
+    # as digits in base vocabulary_size. Returns None when those keys would
+    # overflow 64 bits.
+    if vocabulary_size ** n >= 2 ** 63:
+        return None
+    count = len(ids) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    keys = ids[:count].copy()
+    for offset in range(1, n):
+        keys *= vocabulary_size
+        keys += ids[offset:offset + count]
+    inside = paragraphs[:count] == paragraphs[n - 1:n - 1 + count]
+    return keys[inside]
+
+def decode_ngrams(keys, n, vocabulary_size):
+    # Inverse of ngram_keys: an (m, n) array of token IDs
+    ngrams = np.empty((len(keys), n), dtype=np.int64)
+    for position in range(n - 1, -1, -1):
+        keys, ngrams[:, position] = np.divmod(keys, vocabulary_size)
+    return ngrams
+
+def ngram_counts(ids, paragraphs, n, vocabulary_size):
+    # (ngrams, counts): ngrams is an (m, n) array of token IDs for the m
+    # distinct n-grams, in order of their IDs
+    keys = ngram_keys(ids, paragraphs, n, vocabulary_size)
+    if keys is not None:
+        keys, counts = np.unique(keys, return_counts=True)
+        return decode_ngrams(keys, n, vocabulary_size), counts
+
+    # Huge vocabularies: unique rows of the stacked ID columns instead
+    count = max(len(ids) - n + 1, 0)
+    rows = np.stack([ids[offset:offset + count] for offset in range(n)], axis=1)
+    rows = rows[paragraphs[:count] == paragraphs[n - 1:n - 1 + count]]
+    return np.unique(rows, axis=0, return_counts=True)
+
+def sum_ngram_counts(parts, n, vocabulary_size):
+    # Merge (ngrams, counts) pairs counted over different stretches of the
+    # text into one, adding up equal n-grams by their integer key. Rows come
+    # out in order of their token IDs, as from ngram_counts.
+    ngrams = np.concatenate([np.zeros((0, n), dtype=np.int64)] + [ngrams for ngrams, _ in parts])
+    counts = np.concatenate([np.zeros(0, dtype=np.int64)] + [counts for _, counts in parts])
+    if vocabulary_size ** n < 2 ** 63:
+        keys = ngrams[:, 0].copy()
+        for position in range(1, n):
+            keys *= vocabulary_size
+            keys += ngrams[:, position]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        merged = decode_ngrams(keys, n, vocabulary_size)
+    else:
+        merged, inverse = np.unique(ngrams, axis=0, return_inverse=True)
+    summed = np.bincount(inverse.ravel(), weights=counts, minlength=len(merged))
+    return merged, summed.astype(np.int64)
+
+def new_ngram_totals():
+    # Running n-gram counts of the sections merged so far: a list of
+    # (ngrams, counts) parts for n = 2 and 3, the first part already summed,
+    # and the last two (paragraph, token ID) pairs of the text
+    return {2: [], 3: [], 'last_words': []}
+
+def add_ngram_counts(totals, n, ngrams, counts, vocabulary_size):
+    parts = totals[n]
+    parts.append((ngrams, counts))
+    # Sum the parts whenever the new ones outgrow the summed first part, so
+    # each n-gram is summed a bounded number of times, amortized
+    if sum(len(counts) for _, counts in parts[1:]) > len(parts[0][1]):
+        parts[:] = [sum_ngram_counts(parts, n, vocabulary_size)]
+
+def add_boundary_ngrams(totals, before, after, vocabulary_size):
+    # Add the n-grams made of words on both sides of a section boundary:
+    # before is the last two (paragraph, token ID) pairs of the text so far,
+    # after the first two of the section that follows
+    words = list(before) + list(after)
+    for n in (2, 3):
+        rows = [[token for _, token in words[i:i + n]]
+                for i in range(max(len(before) - n + 1, 0), len(before))
+                if i + n <= len(words) and words[i][0] == words[i + n - 1][0]]
+        if rows:
+            add_ngram_counts(totals, n, np.array(rows, dtype=np.int64),
+                             np.ones(len(rows), dtype=np.int64), vocabulary_size)
+
+def add_section_ngrams(totals, word_ids, tokens, paragraph_runs, paragraph_offset, vocabulary_size):
+    # Count the n-grams of the next section of the text into totals. tokens
+    # are the section's uint32 token IDs into its own vocabulary, which
+    # word_ids maps into the whole text's; paragraph_runs holds [paragraph,
+    # first token] for each of its paragraphs with words, numbered within
+    # the section and shifted by paragraph_offset.
+    ids = np.asarray(word_ids, dtype=np.int64)[np.frombuffer(tokens, dtype=np.uint32)]
+    runs = np.array(paragraph_runs, dtype=np.int64).reshape(-1, 2)
+    paragraphs = np.repeat(runs[:, 0] + paragraph_offset, np.diff(np.append(runs[:, 1], len(ids))))
+
+    first = list(zip(paragraphs[:2].tolist(), ids[:2].tolist()))
+    last = list(zip(paragraphs[-2:].tolist(), ids[-2:].tolist()))
+    add_boundary_ngrams(totals, totals['last_words'], first, vocabulary_size)
+    totals['last_words'] = (totals['last_words'] + last)[-2:]
+
+    for n in (2, 3):
+        add_ngram_counts(totals, n, *ngram_counts(ids, paragraphs, n, vocabulary_size), vocabulary_size)
+
+def ngram_totals(totals, n, vocabulary_size):
+    # (ngrams, counts) of the whole text so far
+    return sum_ngram_counts(totals[n], n, vocabulary_size)
+
+def top_entries(scores, counts, limit):
+    # Indices of the highest scores (ties broken by count), best first
+    order = np.lexsort((-counts, -scores))
+    return order[:limit]
+
+def ngram_text(vocabulary, ngram):
+    return ' '.join(vocabulary[i] for i in ngram)
+
+def log_likelihood(k11, k12, k21, k22):
+    # Dunning's G² for the 2x2 contingency table of each bigram
+    total = k11 + k12 + k21 + k22
+    rows = (k11 + k12, k21 + k22)
+    columns = (k11 + k21, k12 + k22)
+    g2 = np.zeros(len(k11))
+    for observed, row, column in ((k11, rows[0], columns[0]), (k12, rows[0], columns[1]),
+                                  (k21, rows[1], columns[0]), (k22, rows[1], columns[1])):
+        expected = row * column / total
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g2 += np.where(observed > 0, observed * np.log(observed / expected), 0.0)
+    return 2 * g2
+
+def most_common_ngrams(vocabulary, is_stop, ngrams, counts):
+    # Skip n-grams that start or end with a stop word ("of the", "the gods")
+    # but keep inner ones ("son of laertes")
+    content = ~is_stop[ngrams[:, 0]] & ~is_stop[ngrams[:, -1]]
+    ngrams, counts = ngrams[content], counts[content]
+    return [[ngram_text(vocabulary, ngrams[i]), int(counts[i])]
+            for i in top_entries(counts.astype(np.float64), counts, TOP_NGRAMS)]
+
+def collocation_scores(vocabulary, is_stop, bigrams, counts):
+    # PMI and log-likelihood of every bigram of two content words seen at
+    # least MIN_COLLOCATION_COUNT times, against the word frequencies over
+    # all bigram positions
+    size = len(vocabulary)
+    total = counts.sum()
+    first_counts = np.bincount(bigrams[:, 0], weights=counts, minlength=size)
+    second_counts = np.bincount(bigrams[:, 1], weights=counts, minlength=size)
+
+    keep = (counts >= MIN_COLLOCATION_COUNT) & ~is_stop[bigrams[:, 0]] & ~is_stop[bigrams[:, 1]]
+    bigrams, counts = bigrams[keep], counts[keep].astype(np.float64)
+    first = first_counts[bigrams[:, 0]]
+    second = second_counts[bigrams[:, 1]]
+
+    pmi = np.log2(counts * total / (first * second))
+    g2 = log_likelihood(counts, first - counts, second - counts, total - first - second + counts)
+
+    return {
+        name: [[ngram_text(vocabulary, bigrams[i]), round(float(scores[i]), 3), int(counts[i])]
+               for i in top_entries(scores, counts, TOP_COLLOCATIONS)]
+        for name, scores in (('pmi', pmi), ('log_likelihood', g2))
+    }
+
+def score_ngrams(vocabulary, stop_words, bigrams, bigram_counts, trigrams, trigram_counts):
+    is_stop = np.array([word in stop_words for word in vocabulary], dtype=bool)
+    return {
+        'most_common_bigrams': most_common_ngrams(vocabulary, is_stop, bigrams, bigram_counts),
+        'most_common_trigrams': most_common_ngrams(vocabulary, is_stop, trigrams, trigram_counts),
+        'collocations': collocation_scores(vocabulary, is_stop, bigrams, bigram_counts),
+    }
+
+def ngram_statistics(ids, paragraphs, vocabulary, stop_words):
+    # Statistics straight from token arrays. N-grams never cross a paragraph
+    # break.
+    size = len(vocabulary)
+    return score_ngrams(vocabulary, stop_words, *ngram_counts(ids, paragraphs, 2, size),
+                        *ngram_counts(ids, paragraphs, 3, size))
+
+def ngram_statistics_from_totals(totals, vocabulary, stop_words):
+    # Statistics from the counts gathered section by section
+    size = len(vocabulary)
+    return score_ngrams(vocabulary, stop_words, *ngram_totals(totals, 2, size), *ngram_totals(totals, 3, size))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import struct
+import zlib
+
+# Brotli is optional; without it only .gz files are written
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions worth compressing ahead of time
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json', '.txt', '.svg')
+
+# Content-hashed names look like book-I.3f9c2a7b1e.html; the server marks
+# them immutable because their content can never change under that name
+HASH_LENGTH = 10
+HASHED_NAME_PATTERN = re.compile(r'\.[0-9a-f]{%d}\.[A-Za-z0-9]+$' % HASH_LENGTH)
+
+# A gzip member assembled from separately deflated pieces (see
+# gzip_from_pieces): the same header gzip.compress writes with mtime=0 and
+# level 9, and an empty final block to end the deflate stream
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff'
+GZIP_FINAL_BLOCK = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS).flush()
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+def hashed_name(name, data):
+    # odyssey_final.html -> odyssey_final.<hash>.html
+    base, ext = os.path.splitext(name)
+    return f"{base}.{content_hash(data)}{ext}"
+
+def is_hashed_name(name):
+    return HASHED_NAME_PATTERN.search(name) is not None
+
+def write_bytes(path, data):
+    # Replace the file atomically, and leave it untouched when the content is
+    # already right so its mtime (and any ETag derived from it) stays stable
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return
+    except OSError:
+        pass
+
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file, path)
+
+def remove_brotli(path):
+    # A stale .br would be served in place of the new content
+    if os.path.exists(path + '.br'):
+        os.remove(path + '.br')
+
+def write_brotli(path, data):
+    # Write path.br when brotli is installed; returns the files written
+    br_file = path + '.br'
+    if brotli is not None:
+        write_bytes(br_file, brotli.compress(data, quality=11))
+        return [br_file]
+    remove_brotli(path)
+    return []
+
+def compress_file(path):
+    # Write path.gz (and path.br when brotli is installed) next to path.
+    # mtime=0 keeps the gzip output identical for identical input.
+    # Returns the compressed files written.
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    written = [path + '.gz']
+    write_bytes(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    return written + write_brotli(path, data)
+
+def deflate_piece(data):
+    # Raw deflate blocks for one piece of a larger file. A fresh compressor
+    # and a full flush at the end make the blocks independent of the pieces
+    # around them, so a compressed piece can be reused wherever the same
+    # bytes recur.
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+def gzip_from_pieces(deflated, data):
+    # One gzip member for data from the deflate_piece output of its pieces,
+    # in order. Only the checksum is computed over the whole of data.
+    trailer = struct.pack('<II', zlib.crc32(data), len(data) & 0xffffffff)
+    return GZIP_HEADER + b''.join(deflated) + GZIP_FINAL_BLOCK + trailer
+
+def compress_files(paths):
+    written = []
+    for path in paths:
+        if path.endswith(COMPRESSIBLE_EXTENSIONS):
+            written.extend(compress_file(path))
+    return written
+
+def find_compressible(directory):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.endswith(COMPRESSIBLE_EXTENSIONS)
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write .gz (and .br, if brotli is installed) copies of static files")
+    parser.add_argument('paths', nargs='*', default=["odyssey_final.html", "index.html", "odyssey.html"],
+                        help="files or directories to compress")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(find_compressible(path) if os.path.isdir(path) else [path])
+
+    for path in compress_files(files):
+        original = path.rsplit('.', 1)[0]
+        print(f"{path}: {os.path.getsize(path):,} bytes "
+              f"({os.path.getsize(path) / os.path.getsize(original):.1%} of original)")
+
+    if brotli is None:
+        print("brotli module not installed: only .gz files written")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import argparse
+import email.utils
+import functools
+import hashlib
+import os
+import re
+import urllib.parse
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from precompress import HASH_LENGTH, is_hashed_name
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# File digests by (path, size, mtime); computed once per file version
+_digests = {}
+
+def file_digest(path, stat):
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+def strong_etag(path, stat):
+    return f'"{file_digest(path, stat)[:32]}"'
+
+def is_versioned(path, query):
+    # A "?v=<hash>" URL names one exact version of the file (see
+    # create_final_html.search_index_url); only cache it forever when the
+    # hash matches what is on disk
+    version = urllib.parse.parse_qs(query).get('v')
+    return bool(version) and version[0] == file_digest(path, os.stat(path))[:HASH_LENGTH]
+
+def accepted_encodings(header):
+    # Codings from an Accept-Encoding header, ignoring those with q=0
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+def parse_range(header, size):
+    # A single "bytes=start-end" range as (start, end) inclusive, None to
+    # ignore the header, or False when the range cannot be satisfied.
+    # Multi-range requests are answered with the whole file.
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    if end and start > int(end):
+        return None
+    if start >= size:
+        return False
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+class StaticFileHandler(SimpleHTTPRequestHandler):
+    # Serves precompressed .br/.gz siblings with Content-Encoding, strong
+    # ETags with If-None-Match revalidation, immutable caching for
+    # content-hashed names, and single byte ranges
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+
+        if os.path.isdir(path):
+            index = os.path.join(path, 'index.html')
+            if not self.path.split('?', 1)[0].endswith('/') or not os.path.isfile(index):
+                # Redirects and directory listings are left to the base class
+                return super().send_head()
+            path = index
+
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        # Pick the smallest representation the client accepts
+        encoding = None
+        file_path = path
+        accepted = accepted_encodings(self.headers.get('Accept-Encoding'))
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and os.path.isfile(path + suffix):
+                encoding = coding
+                file_path = path + suffix
+                break
+
+        f = open(file_path, 'rb')
+        try:
+            stat = os.fstat(f.fileno())
+            etag = strong_etag(file_path, stat)
+            size = stat.st_size
+
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                f.close()
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_cache_headers(path, etag)
+                self.end_headers()
+                return None
+
+            byte_range = None
+            range_header = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            if range_header and (if_range is None or if_range.strip() == etag):
+                byte_range = parse_range(range_header, size)
+
+            if byte_range is False:
+                f.close()
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                f.seek(start)
+                self.remaining = end - start + 1
+            else:
+                self.send_response(HTTPStatus.OK)
+                self.remaining = size
+
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Length', str(self.remaining))
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True))
+            self.send_cache_headers(path, etag)
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def send_cache_headers(self, path, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Vary', 'Accept-Encoding')
+        query = urllib.parse.urlsplit(self.path).query
+        if is_hashed_name(os.path.basename(path)) or is_versioned(path, query):
+            self.send_header('Cache-Control', IMMUTABLE_CACHE)
+        else:
+            self.send_header('Cache-Control', REVALIDATE_CACHE)
+
+    def copyfile(self, source, outputfile):
+        # Only copy the requested range
+        remaining = getattr(self, 'remaining', None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            block = source.read(min(remaining, 1 << 16))
+            if not block:
+                break
+            outputfile.write(block)
+            remaining -= len(block)
+
+def serve(directory='.', host='127.0.0.1', port=8000):
+    handler = functools.partial(StaticFileHandler, directory=directory)
+    with ThreadingHTTPServer((host, port), handler) as server:
+        print(f"Serving {os.path.abspath(directory)} at http://{host}:{server.server_address[1]}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nServer stopped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the generated pages with precompression, ETags and range requests")
+    parser.add_argument('directory', nargs='?', default='.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    serve(args.directory, args.host, args.port)
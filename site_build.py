@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from add_newlines_after_commas import add_newlines_to_text
+from analyze_odyssey_stats import analyze_odyssey_lines, stats_to_json
+from build import ARTIFACT_FILES, COMPRESSED
+from create_final_html import (
+    remove_stale_fragments, render_odyssey_html, render_odyssey_html_split, render_search_index,
+    search_index_file, search_index_url,
+)
+from create_odyssey_html import render_html_page
+from extract_odyssey_only import select_odyssey_lines
+from format_odyssey_nicely import format_odyssey_lines
+from instrumentation import add_profile_arguments, profile_stage
+from precompress import compress_file, write_bytes
+
+# Rendering and compression are CPU-bound and run on a process pool; file
+# writes go to a thread pool. The coroutines below only wire the two
+# together, so every artifact starts as soon as its inputs are ready.
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def extract_text(raw):
+    return ''.join(select_odyssey_lines(io.StringIO(raw)))
+
+def analyze_to_json(lines):
+    return json.dumps(stats_to_json(analyze_odyssey_lines(lines)), indent=2)
+
+def text_lines(text):
+    # Same line splitting as reading the text back from a file
+    return io.StringIO(text).readlines()
+
+async def build_site(raw_file=ARTIFACT_FILES['raw'], output_dir='.', split_dir=None,
+                     write_intermediates=True, jobs=None):
+    # Rebuild every output of the pipeline concurrently: the statistics JSON,
+    # the search index, odyssey_final.html, index.html and odyssey.html (plus
+    # the per-book pages in split_dir). The text is extracted, formatted and
+    # split into lines once, and that one parsed copy feeds every renderer.
+    # Returns {artifact: seconds from the start until it was on disk}.
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    finished = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as processes, ThreadPoolExecutor() as threads:
+        def render(func, *args):
+            return loop.run_in_executor(processes, func, *args)
+
+        async def write(path, content, compress=True):
+            data = content.encode('utf-8') if isinstance(content, str) else content
+            await loop.run_in_executor(threads, write_bytes, path, data)
+            if compress:
+                await render(compress_file, path)
+
+        async def publish(name, path, content):
+            # Published pages get .gz/.br copies, as in build.py
+            await write(path, content, compress=name in COMPRESSED or name.startswith('split'))
+            finished[name] = time.perf_counter() - start
+            print(f"  {name:<12} done at {finished[name]:.3f}s -> {path}")
+
+        def artifact(name):
+            return os.path.join(output_dir, ARTIFACT_FILES[name])
+
+        raw = await loop.run_in_executor(threads, read_text, raw_file)
+
+        async def alt_html():
+            commas = await render(add_newlines_to_text, raw)
+            writes = [publish('commas', artifact('commas'), commas)] if write_intermediates else []
+            page = await render(render_html_page, text_lines(commas))
+            await asyncio.gather(publish('alt_html', artifact('alt_html'), page), *writes)
+
+        async def final_html():
+            clean = await render(extract_text, raw)
+            writes = [publish('clean', artifact('clean'), clean)] if write_intermediates else []
+            formatted = await render(format_odyssey_lines, text_lines(clean))
+            if write_intermediates:
+                writes.append(publish('formatted', artifact('formatted'), formatted))
+            lines = text_lines(formatted)
+
+            stats_text, search_text = await asyncio.gather(render(analyze_to_json, lines),
+                                                           render(render_search_index, lines))
+            stats = json.loads(stats_text)
+            writes.append(publish('stats', artifact('stats'), stats_text))
+            writes.append(publish('search', artifact('search'), search_text))
+
+            pages = [render(render_odyssey_html, lines, stats, search_index_url(artifact('search'), search_text))]
+            if split_dir:
+                split_search = search_index_file(os.path.join(split_dir, 'index.html'))
+                pages.append(render(render_odyssey_html_split, lines, stats,
+                                    search_index_url(split_search, search_text)))
+                writes.append(publish('split_search', split_search, search_text))
+
+            pages = await asyncio.gather(*pages)
+            writes.append(publish('html', artifact('html'), pages[0]))
+            writes.append(publish('index', artifact('index'), pages[0]))
+            if split_dir:
+                shell, fragments = pages[1]
+                writes.extend(write(os.path.join(split_dir, name), data) for name, data in fragments)
+                writes.append(publish('split', os.path.join(split_dir, 'index.html'), shell))
+            await asyncio.gather(*writes)
+
+            if split_dir:
+                remove_stale_fragments(split_dir, {name for name, _ in fragments})
+
+        os.makedirs(output_dir, exist_ok=True)
+        if split_dir:
+            os.makedirs(split_dir, exist_ok=True)
+        await asyncio.gather(alt_html(), final_html())
+
+    return finished
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild every output at once, rendering and writing artifacts concurrently")
+    parser.add_argument('raw_file', nargs='?', default=ARTIFACT_FILES['raw'])
+    parser.add_argument('--output-dir', default='.', help="where the pages and statistics are written")
+    parser.add_argument('--split', metavar='DIR', help="also write the per-book shell page and fragments into DIR")
+    parser.add_argument('--no-intermediates', action='store_true',
+                        help="do not write odyssey_clean.txt, odyssey_formatted.txt and Odyssey_formatted.txt")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="worker processes for rendering and compression (default: all cores)")
+    add_profile_arguments(parser, 'site')
+    args = parser.parse_args()
+
+    outputs = [os.path.join(args.output_dir, ARTIFACT_FILES[name]) for name in ARTIFACT_FILES if name != 'raw']
+    if args.split:
+        outputs.append(args.split)
+    with profile_stage('site', args.profile, args.cprofile, inputs=[args.raw_file], outputs=outputs):
+        start = time.perf_counter()
+        finished = asyncio.run(build_site(args.raw_file, args.output_dir, args.split,
+                                          write_intermediates=not args.no_intermediates, jobs=args.jobs))
+        elapsed = time.perf_counter() - start
+
+    slowest = max(finished, key=finished.get)
+    print(f"Site built in {elapsed:.3f}s: {len(finished)} artifacts, last was {slowest}")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import base64
+import hashlib
+import json
+import os
+from array import array
+from collections import Counter
+
+from analyze_odyssey_stats import (
+    ANALYZER_VERSION, analyze_sections, find_book_sections, reduce_section_counts, stats_to_json,
+)
+from instrumentation import phase
+import ngram_stats
+
+DEFAULT_CACHE_FILE = 'odyssey_stats.cache.json'
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def section_hashes(input_file, sections):
+    # One key per BOOK section. The first section is analyzed slightly
+    # differently (a leading blank line is not a paragraph break), so its
+    # position is part of the key.
+    hashes = []
+    with open(input_file, 'rb') as f:
+        for _, start, end in sections:
+            f.seek(start)
+            digest = hashlib.sha256(f.read(end - start)).hexdigest()
+            hashes.append(f"{digest}:{int(start == 0)}")
+    return hashes
+
+def counts_to_json(counts):
+    json_counts = counts.copy()
+    json_counts['word_freq'] = dict(counts['word_freq'])
+    # The token IDs go in as base64 of their uint32 bytes, about 5.3
+    # characters a word
+    json_counts['tokens'] = base64.b64encode(counts['tokens'].tobytes()).decode('ascii')
+    return json_counts
+
+def counts_from_json(json_counts):
+    counts = json_counts.copy()
+    counts['word_freq'] = Counter(json_counts['word_freq'])
+    counts['tokens'] = array('I', base64.b64decode(json_counts['tokens']))
+    # JSON object keys are strings; sentence lengths are ints
+    runs = json_counts['sentence_runs']
+    counts['sentence_runs'] = dict(runs, closed=Counter({int(length): n for length, n in runs['closed'].items()}))
+    counts['entities'] = {
+        kind: {name: [tuple(position) for position in positions] for name, positions in mentions.items()}
+        for kind, mentions in json_counts['entities'].items()
+    }
+    return counts
+
+def load_cache(cache_file):
+    # A missing, unreadable or outdated cache is treated as empty
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    # Statistics computed without NumPy lack the n-grams, lengths and
+    # distinctive terms, so they are not reused once NumPy is installed
+    if cache.get('analyzer_version') != ANALYZER_VERSION or cache.get('numpy') != (ngram_stats.np is not None):
+        return {}
+    return cache
+
+def save_cache(cache_file, cache):
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        # json.dumps runs the C encoder; json.dump to a file does not
+        f.write(json.dumps(cache))
+    os.replace(temp_file, cache_file)
+
+def load_or_compute_stats(input_file, cache_file=DEFAULT_CACHE_FILE, jobs=1):
+    # Return the JSON-ready statistics for input_file. They are reused as-is
+    # when the text hash matches the cache; otherwise only the BOOK sections
+    # whose content changed are re-analyzed and the cache is refreshed.
+    with phase('load_cache'):
+        text_hash = file_hash(input_file)
+        cache = load_cache(cache_file)
+
+    if cache.get('text_hash') == text_hash:
+        print(f"Statistics up to date in {cache_file}")
+        return cache['stats']
+
+    with phase('find_sections'):
+        sections = find_book_sections(input_file)
+        hashes = section_hashes(input_file, sections)
+    cached_sections = cache.get('sections', {})
+
+    missing = [i for i, key in enumerate(hashes) if key not in cached_sections]
+    fresh_counts = analyze_sections(input_file, [sections[i] for i in missing], jobs)
+    saved_sections = {}
+
+    def section_counts():
+        # Fresh counts arrive in the order of their sections, so every
+        # section can be merged as it comes; only its JSON form is kept, for
+        # the cache
+        missing_set = set(missing)
+        for i, key in enumerate(hashes):
+            if i in missing_set:
+                counts = next(fresh_counts)
+                saved_sections[key] = counts_to_json(counts)
+            else:
+                saved_sections[key] = cached_sections[key]
+                counts = counts_from_json(cached_sections[key])
+            yield counts
+
+    with phase('count_sections'):
+        stats = reduce_section_counts(sections, section_counts())
+
+    # Round-trip through JSON so fresh and cached results look the same
+    stats = json.loads(json.dumps(stats_to_json(stats)))
+
+    with phase('save_cache'):
+        save_cache(cache_file, {
+            'analyzer_version': ANALYZER_VERSION,
+            'numpy': ngram_stats.np is not None,
+            'text_hash': text_hash,
+            'stats': stats,
+            'sections': saved_sections,
+        })
+
+    print(f"Analyzed {len(missing)} of {len(sections)} sections, statistics cached in {cache_file}")
+    return stats
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from analyze_odyssey_stats import iter_positioned_words
+from stats_cache import file_hash
+
+DEFAULT_TEXT_FILE = 'odyssey_formatted.txt'
+DEFAULT_INDEX_FILE = 'odyssey.index'
+
+INDEX_MAGIC = b'ODYINDEX'
+INDEX_VERSION = 1
+
+# Every word the statistics count gets a position: its number in reading
+# order. The index file is a header followed by flat arrays, each 8-byte
+# aligned, so it can be memory-mapped and used without parsing:
+#   term_offsets       uint32[terms + 1]  byte offsets into terms
+#   terms              sorted UTF-8 words, concatenated
+#   posting_offsets    uint32[terms + 1]  offsets into positions
+#   positions          uint32[]           ascending positions of each term
+#   tokens             uint32[words]      term number at each position
+#   book_starts        uint32[books]      first position of each book
+#   books              book numerals, newline separated
+#   paragraph_starts   uint32[]           first position of each paragraph with words
+#   paragraph_numbers  uint32[]           its paragraph number (as in the statistics)
+SECTIONS = (
+    'term_offsets', 'terms', 'posting_offsets', 'positions', 'tokens',
+    'book_starts', 'books', 'paragraph_starts', 'paragraph_numbers',
+)
+BYTE_SECTIONS = {'terms', 'books'}
+
+# magic, version, term count, word count, SHA-256 of the source text, then
+# (offset, length) in bytes for every section
+HEADER = struct.Struct('<8sIII32s' + 'QQ' * len(SECTIONS))
+
+def uint32_array(values=()):
+    arr = array('I', values)
+    if arr.itemsize != 4:
+        arr = array('L', values)
+    return arr
+
+def collect_index_data(lines):
+    # One pass over the text: term -> positions, plus the book and paragraph
+    # boundaries in word positions
+    postings = {}
+    words = []
+    book_names = []
+    book_starts = uint32_array()
+    paragraph_starts = uint32_array()
+    paragraph_numbers = uint32_array()
+    last_book = None
+    last_paragraph = None
+
+    for position, (book, paragraph, word) in enumerate(iter_positioned_words(lines)):
+        if book != last_book:
+            book_names.append(book)
+            book_starts.append(position)
+            last_book = book
+        if paragraph != last_paragraph:
+            paragraph_starts.append(position)
+            paragraph_numbers.append(paragraph)
+            last_paragraph = paragraph
+        postings.setdefault(word, []).append(position)
+        words.append(word)
+
+    # Words before the first BOOK header have no book
+    if book_names and book_names[0] is None:
+        book_names.pop(0)
+        book_starts.pop(0)
+
+    return postings, words, book_names, book_starts, paragraph_starts, paragraph_numbers
+
+def build_index(text_file, index_file):
+    with open(text_file, 'r', encoding='utf-8') as f:
+        postings, words, book_names, book_starts, paragraph_starts, paragraph_numbers = collect_index_data(f)
+
+    terms = sorted(postings)
+    term_ids = {term: i for i, term in enumerate(terms)}
+
+    term_blob = bytearray()
+    term_offsets = uint32_array([0])
+    posting_offsets = uint32_array([0])
+    positions = uint32_array()
+    for term in terms:
+        term_blob += term.encode('utf-8')
+        term_offsets.append(len(term_blob))
+        positions.extend(postings[term])
+        posting_offsets.append(len(positions))
+
+    data = {
+        'term_offsets': term_offsets,
+        'terms': bytes(term_blob),
+        'posting_offsets': posting_offsets,
+        'positions': positions,
+        'tokens': uint32_array(term_ids[word] for word in words),
+        'book_starts': book_starts,
+        'books': '\n'.join(book_names).encode('utf-8'),
+        'paragraph_starts': paragraph_starts,
+        'paragraph_numbers': paragraph_numbers,
+    }
+
+    # The file is always little-endian
+    if sys.byteorder != 'little':
+        for name in SECTIONS:
+            if name not in BYTE_SECTIONS:
+                data[name].byteswap()
+
+    layout = []
+    offset = HEADER.size
+    for name in SECTIONS:
+        offset = (offset + 7) & ~7
+        size = len(data[name]) * (1 if name in BYTE_SECTIONS else 4)
+        layout.extend((offset, size))
+        offset += size
+
+    temp_file = index_file + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(terms), len(words),
+                            bytes.fromhex(file_hash(text_file)), *layout))
+        for name, section_offset in zip(SECTIONS, layout[::2]):
+            f.write(b'\0' * (section_offset - f.tell()))
+            f.write(data[name] if name in BYTE_SECTIONS else data[name].tobytes())
+    os.replace(temp_file, index_file)
+
+    print(f"Indexed {len(words):,} words ({len(terms):,} distinct) from {text_file} into {index_file} "
+          f"({os.path.getsize(index_file):,} bytes)")
+
+def open_index(index_file):
+    # Map the index file; the arrays are zero-copy views into the mapping, so
+    # opening costs the same however large the index is
+    with open(index_file, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < HEADER.size:
+        raise ValueError(f"{index_file}: not a text index")
+    magic, version, term_count, word_count, source_hash, *layout = HEADER.unpack_from(mapped)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        raise ValueError(f"{index_file}: not a version {INDEX_VERSION} text index")
+
+    view = memoryview(mapped)
+    index = {
+        'file': index_file,
+        'mmap': mapped,
+        'term_count': term_count,
+        'word_count': word_count,
+        'source_hash': source_hash.hex(),
+    }
+    for name, offset, size in zip(SECTIONS, layout[::2], layout[1::2]):
+        section = view[offset:offset + size]
+        if name in BYTE_SECTIONS:
+            index[name] = section
+        elif sys.byteorder == 'little':
+            index[name] = section.cast('I')
+        else:
+            values = uint32_array()
+            values.frombytes(section)
+            values.byteswap()
+            index[name] = values
+
+    books = bytes(index['books']).decode('utf-8')
+    index['book_names'] = books.split('\n') if books else []
+    return index
+
+def close_index(index):
+    # The memoryviews must be released before the mapping can be closed
+    for name in SECTIONS:
+        if isinstance(index[name], memoryview):
+            index[name].release()
+    index['mmap'].close()
+
+def load_or_build_index(text_file=DEFAULT_TEXT_FILE, index_file=DEFAULT_INDEX_FILE, rebuild=False):
+    # Open the index, rebuilding it first if it is missing or was built from
+    # a different version of the text
+    if not rebuild and os.path.exists(index_file):
+        try:
+            index = open_index(index_file)
+        except ValueError:
+            pass
+        else:
+            if index['source_hash'] == file_hash(text_file):
+                return index
+            close_index(index)
+
+    build_index(text_file, index_file)
+    return open_index(index_file)
+
+def term_id(index, word):
+    # Binary search over the sorted terms; None if the word never occurs
+    target = word.lower().encode('utf-8')
+    offsets = index['term_offsets']
+    terms = index['terms']
+    low, high = 0, index['term_count']
+    while low < high:
+        mid = (low + high) // 2
+        if bytes(terms[offsets[mid]:offsets[mid + 1]]) < target:
+            low = mid + 1
+        else:
+            high = mid
+    if low < index['term_count'] and bytes(terms[offsets[low]:offsets[low + 1]]) == target:
+        return low
+    return None
+
+def term_positions(index, word):
+    # Ascending positions of word, as a zero-copy sequence
+    term = term_id(index, word)
+    if term is None:
+        return index['positions'][0:0]
+    offsets = index['posting_offsets']
+    return index['positions'][offsets[term]:offsets[term + 1]]
+
+def contains(positions, position):
+    i = bisect_left(positions, position)
+    return i < len(positions) and positions[i] == position
+
+def find_term(index, word):
+    return list(term_positions(index, word))
+
+def paragraph_span(index, position):
+    # (first, last + 1) positions of the paragraph holding position. Every
+    # book starts a new paragraph, so the span never crosses a book either.
+    starts = index['paragraph_starts']
+    i = bisect_right(starts, position)
+    return (starts[i - 1] if i else 0,
+            starts[i] if i < len(starts) else index['word_count'])
+
+def find_phrase(index, words):
+    # Start positions of the words appearing consecutively within one
+    # paragraph. The rarest word drives the search; the others are checked
+    # by binary search.
+    if not words:
+        return []
+    postings = [term_positions(index, word) for word in words]
+    rarest = min(range(len(words)), key=lambda i: len(postings[i]))
+
+    matches = []
+    for position in postings[rarest]:
+        start = position - rarest
+        first, end = paragraph_span(index, position)
+        if start < first or start + len(words) > end:
+            continue
+        if all(i == rarest or contains(positions, start + i) for i, positions in enumerate(postings)):
+            matches.append(start)
+    return matches
+
+def find_near(index, first, second, distance, ordered=False):
+    # (first position, second position) pairs at most distance words apart
+    # in the same paragraph; with ordered=True the second word must come
+    # after the first. The rarer word drives the search.
+    first_positions = term_positions(index, first)
+    second_positions = term_positions(index, second)
+    swapped = len(first_positions) > len(second_positions)
+    if swapped:
+        first_positions, second_positions = second_positions, first_positions
+
+    matches = []
+    for position in first_positions:
+        first, end = paragraph_span(index, position)
+        low = max(position - distance, first)
+        high = min(position + distance, end - 1)
+        if ordered:
+            if swapped:
+                high = position - 1
+            else:
+                low = position + 1
+        for i in range(bisect_left(second_positions, low), bisect_right(second_positions, high)):
+            other = second_positions[i]
+            if other != position:
+                matches.append((other, position) if swapped else (position, other))
+
+    if swapped:
+        matches.sort()
+    return matches
+
+def locate(index, position):
+    # (book, paragraph) of a word position; book is None before BOOK I
+    book = bisect_right(index['book_starts'], position) - 1
+    paragraph = bisect_right(index['paragraph_starts'], position) - 1
+    return (index['book_names'][book] if book >= 0 else None,
+            index['paragraph_numbers'][paragraph] if paragraph >= 0 else None)
+
+def word_at(index, position):
+    term = index['tokens'][position]
+    offsets = index['term_offsets']
+    return bytes(index['terms'][offsets[term]:offsets[term + 1]]).decode('utf-8')
+
+def context(index, position, length=1, width=6):
+    # The words around position..position+length-1, as (before, match, after)
+    start = max(position - width, 0)
+    end = min(position + length + width, index['word_count'])
+    return (' '.join(word_at(index, i) for i in range(start, position)),
+            ' '.join(word_at(index, i) for i in range(position, position + length)),
+            ' '.join(word_at(index, i) for i in range(position + length, end)))
+
+def print_matches(index, matches, limit):
+    # matches: (position, length) of each matched span
+    for position, length in matches[:limit]:
+        book, paragraph = locate(index, position)
+        before, match, after = context(index, position, length)
+        print(f"Book {book or '-':<6} ¶{paragraph:<5} @{position:<7} {before} [{match}] {after}")
+    if len(matches) > limit:
+        print(f"... {len(matches) - limit:,} more")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Positional word index for term, phrase and proximity queries")
+    parser.add_argument('words', nargs='*',
+                        help="one word for a term query, several for a phrase query")
+    parser.add_argument('--near', type=int, metavar='N',
+                        help="with two words: find them within N words of each other")
+    parser.add_argument('--ordered', action='store_true', help="with --near: first word must come first")
+    parser.add_argument('--text', default=DEFAULT_TEXT_FILE)
+    parser.add_argument('--index', default=DEFAULT_INDEX_FILE)
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the index even if it is current")
+    parser.add_argument('--limit', type=int, default=20, help="matches to print")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_or_build_index(args.text, args.index, rebuild=args.rebuild)
+    opened = time.perf_counter() - start
+
+    if args.words:
+        start = time.perf_counter()
+        if args.near is not None:
+            if len(args.words) != 2:
+                parser.error("--near takes exactly two words")
+            pairs = find_near(index, args.words[0], args.words[1], args.near, ordered=args.ordered)
+            elapsed = time.perf_counter() - start
+            matches = [(min(pair), abs(pair[1] - pair[0]) + 1) for pair in pairs]
+        else:
+            positions = find_phrase(index, args.words)
+            elapsed = time.perf_counter() - start
+            matches = [(position, len(args.words)) for position in positions]
+
+        print_matches(index, matches, args.limit)
+        print(f"\n{len(matches):,} matches in {elapsed * 1000:.3f} ms (index opened in {opened * 1000:.1f} ms)")
+
+    close_index(index)
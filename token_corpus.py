@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from bisect import bisect_right
+from collections import Counter
+
+# NumPy is optional; without it entity candidates are found in plain Python
+# and the token statistics are skipped
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from analyze_odyssey_stats import (
+    ANALYZER_VERSION, ENTITY_GROUPS, STOP_WORDS, add_token_stats, iter_positioned_words, mention_timeline,
+    new_text_counts, save_stats_to_json, summarize_book_counts, summarize_text_counts,
+)
+from stats_cache import file_hash
+from text_index import DEFAULT_TEXT_FILE, uint32_array
+import keyness_stats
+import length_stats
+import ngram_stats
+
+DEFAULT_CORPUS_FILE = 'odyssey.tokens'
+
+CORPUS_MAGIC = b'ODYTOKEN'
+CORPUS_VERSION = 2
+
+# The text as a stream of token IDs into a vocabulary stored once, about
+# 4 bytes per word instead of a str object per word. Same layout rules as
+# text_index.py: a header, then 8-byte aligned little-endian sections.
+#   vocabulary        words in order of first occurrence, newline separated
+#   tokens            uint32[words]  vocabulary ID of each word
+#   book_starts       uint32[]       first word of each run of a book's words
+#   books             the book numeral of each run, newline separated
+#   paragraph_starts  uint32[]       first word of paragraph 0, 1, ... (a
+#                                    paragraph without words starts where the
+#                                    next word is)
+#   sentence_ends     uint32[]       word count at each run of sentence-ending
+#                                    punctuation
+#   counts            JSON: the line-level counts that are not about words
+SECTIONS = ('vocabulary', 'tokens', 'book_starts', 'books', 'paragraph_starts', 'sentence_ends', 'counts')
+BYTE_SECTIONS = {'vocabulary', 'books', 'counts'}
+
+# magic, version, analyzer version, vocabulary size, word count, SHA-256 of
+# the source text, then (offset, length) in bytes for every section. The
+# tokens follow the analyzer's tokenizer, so a corpus built by another
+# ANALYZER_VERSION is rebuilt like one built from another text.
+HEADER = struct.Struct('<8sIIII32s' + 'QQ' * len(SECTIONS))
+
+LINE_COUNTS = ('characters', 'characters_no_spaces', 'books', 'sentences', 'paragraphs')
+
+def collect_corpus(lines):
+    # One pass over the text with the analyzer's tokenizer
+    counts = new_text_counts()
+    sentence_ends = []
+    vocabulary = {}
+    tokens = uint32_array()
+    book_names = []
+    book_starts = uint32_array()
+    paragraph_starts = uint32_array()
+    last_book = None
+
+    for position, (book, paragraph, word) in enumerate(iter_positioned_words(lines, counts, sentence_ends=sentence_ends)):
+        tokens.append(vocabulary.setdefault(word, len(vocabulary)))
+        if book != last_book or not position:
+            book_names.append(book)
+            book_starts.append(position)
+            last_book = book
+        while len(paragraph_starts) <= paragraph:
+            paragraph_starts.append(position)
+
+    return {
+        'vocabulary': list(vocabulary),
+        'tokens': tokens,
+        'book_names': book_names,
+        'book_starts': book_starts,
+        'paragraph_starts': paragraph_starts,
+        'sentence_ends': uint32_array(sentence_ends),
+        'counts': {name: counts[name] for name in LINE_COUNTS},
+    }
+
+def build_corpus_file(text_file, corpus_file):
+    with open(text_file, 'r', encoding='utf-8') as f:
+        corpus = collect_corpus(f)
+
+    data = {
+        'vocabulary': '\n'.join(corpus['vocabulary']).encode('utf-8'),
+        'tokens': corpus['tokens'],
+        'book_starts': corpus['book_starts'],
+        'books': '\n'.join(book or '' for book in corpus['book_names']).encode('utf-8'),
+        'paragraph_starts': corpus['paragraph_starts'],
+        'sentence_ends': corpus['sentence_ends'],
+        'counts': json.dumps(corpus['counts']).encode('utf-8'),
+    }
+
+    # The file is always little-endian
+    if sys.byteorder != 'little':
+        for name in SECTIONS:
+            if name not in BYTE_SECTIONS:
+                data[name].byteswap()
+
+    layout = []
+    offset = HEADER.size
+    for name in SECTIONS:
+        offset = (offset + 7) & ~7
+        size = len(data[name]) * (1 if name in BYTE_SECTIONS else 4)
+        layout.extend((offset, size))
+        offset += size
+
+    temp_file = corpus_file + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, ANALYZER_VERSION, len(corpus['vocabulary']),
+                            len(corpus['tokens']), bytes.fromhex(file_hash(text_file)), *layout))
+        for name, section_offset in zip(SECTIONS, layout[::2]):
+            f.write(b'\0' * (section_offset - f.tell()))
+            f.write(data[name] if name in BYTE_SECTIONS else data[name].tobytes())
+    os.replace(temp_file, corpus_file)
+
+    print(f"Stored {len(corpus['tokens']):,} words ({len(corpus['vocabulary']):,} distinct) from {text_file} "
+          f"in {corpus_file} ({os.path.getsize(corpus_file):,} bytes)")
+
+def open_corpus(corpus_file):
+    # Map the corpus file. The token and boundary arrays are zero-copy views
+    # into the mapping; only the vocabulary and the counts are decoded.
+    with open(corpus_file, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < HEADER.size:
+        raise ValueError(f"{corpus_file}: not a token corpus")
+    magic, version, analyzer_version, vocabulary_size, word_count, source_hash, *layout = HEADER.unpack_from(mapped)
+    if magic != CORPUS_MAGIC or version != CORPUS_VERSION:
+        raise ValueError(f"{corpus_file}: not a version {CORPUS_VERSION} token corpus")
+
+    view = memoryview(mapped)
+    corpus = {
+        'file': corpus_file,
+        'mmap': mapped,
+        'word_count': word_count,
+        'analyzer_version': analyzer_version,
+        'source_hash': source_hash.hex(),
+    }
+    sections = {}
+    for name, offset, size in zip(SECTIONS, layout[::2], layout[1::2]):
+        section = view[offset:offset + size]
+        if name in BYTE_SECTIONS:
+            sections[name] = bytes(section).decode('utf-8')
+            section.release()
+        elif sys.byteorder == 'little':
+            corpus[name] = section.cast('I')
+        else:
+            values = uint32_array()
+            values.frombytes(section)
+            values.byteswap()
+            corpus[name] = values
+            section.release()
+
+    corpus['vocabulary'] = sections['vocabulary'].split('\n') if vocabulary_size else []
+    corpus['book_names'] = [book or None for book in sections['books'].split('\n')] if corpus['book_starts'] else []
+    corpus['counts'] = json.loads(sections['counts'])
+    return corpus
+
+def close_corpus(corpus):
+    # The memoryviews must be released before the mapping can be closed
+    for name in SECTIONS:
+        if isinstance(corpus.get(name), memoryview):
+            corpus[name].release()
+    corpus['mmap'].close()
+
+def load_or_build_corpus(text_file=DEFAULT_TEXT_FILE, corpus_file=DEFAULT_CORPUS_FILE, rebuild=False):
+    # Open the corpus, rebuilding it first if it is missing or was built from
+    # a different version of the text or of the analyzer's tokenizer
+    if not rebuild and os.path.exists(corpus_file):
+        try:
+            corpus = open_corpus(corpus_file)
+        except ValueError:
+            pass
+        else:
+            if corpus['analyzer_version'] == ANALYZER_VERSION and corpus['source_hash'] == file_hash(text_file):
+                return corpus
+            close_corpus(corpus)
+
+    build_corpus_file(text_file, corpus_file)
+    return open_corpus(corpus_file)
+
+def corpus_sections(corpus):
+    # (label, start, end) word ranges, one per run of a book's words, with
+    # any words before the first book labelled None, like the analyzer's
+    # BOOK sections
+    starts = list(corpus['book_starts']) + [corpus['word_count']]
+    return [(label, starts[i], starts[i + 1]) for i, label in enumerate(corpus['book_names'])]
+
+def word_frequencies(corpus, start, end):
+    # Counter of the words in [start, end), in order of first occurrence
+    vocabulary = corpus['vocabulary']
+    counts = Counter(corpus['tokens'][start:end])
+    return Counter({vocabulary[token]: count for token, count in counts.items()})
+
+def compile_token_patterns(corpus, entity_groups=ENTITY_GROUPS):
+    # compile_entity_patterns with words replaced by vocabulary IDs; forms
+    # with a word that never occurs are left out
+    vocabulary_ids = {word: i for i, word in enumerate(corpus['vocabulary'])}
+    patterns = {}
+    for kind, names in entity_groups.items():
+        for name, surface_forms in names.items():
+            for form in surface_forms:
+                ids = tuple(vocabulary_ids.get(token) for token in form.split())
+                if None not in ids:
+                    patterns.setdefault(ids[0], []).append((ids, kind, name))
+    for candidates in patterns.values():
+        candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+    return patterns
+
+def find_entities(corpus, start, end, patterns, entity_groups=ENTITY_GROUPS):
+    # Entity mentions in [start, end) as {kind: {name: [(book, paragraph,
+    # word offset)]}}, matched like build_entity_index: left to right, the
+    # longest surface form first, a matched form consuming its words. Only
+    # words that can start a form are looked at.
+    tokens = corpus['tokens']
+    if np is not None:
+        window = np.frombuffer(tokens, dtype=np.uint32)[start:end]
+        candidates = (np.flatnonzero(np.isin(window, list(patterns))) + start).tolist()
+    else:
+        candidates = [offset for offset in range(start, end) if tokens[offset] in patterns]
+
+    paragraph_starts = corpus['paragraph_starts']
+    book_starts = corpus['book_starts']
+    book_names = corpus['book_names']
+    index = {kind: {name: [] for name in names} for kind, names in entity_groups.items()}
+    next_free = start
+    for offset in candidates:
+        if offset < next_free:
+            continue
+        for ids, kind, name in patterns[tokens[offset]]:
+            if offset + len(ids) <= end and all(tokens[offset + j] == ids[j] for j in range(1, len(ids))):
+                book = book_names[bisect_right(book_starts, offset) - 1]
+                paragraph = bisect_right(paragraph_starts, offset) - 1
+                index[kind][name].append((book, paragraph, offset))
+                next_free = offset + len(ids)
+                break
+    return index
+
+def token_arrays(corpus):
+    # (ids, paragraphs) as NumPy arrays: the vocabulary ID and the paragraph
+    # of every word, as ngram_stats.ngram_statistics takes them
+    n = corpus['word_count']
+    ids = np.frombuffer(corpus['tokens'], dtype=np.uint32).astype(np.int64)
+
+    paragraph_starts = np.frombuffer(corpus['paragraph_starts'], dtype=np.uint32).astype(np.int64)
+    paragraphs = np.repeat(np.arange(len(paragraph_starts)), np.diff(np.append(paragraph_starts, n)))
+    return ids, paragraphs
+
+def sentence_length_histograms(corpus):
+    # {book: Counter of sentence lengths}, each sentence counted in the book
+    # of its first word
+    sentence_ends = np.frombuffer(corpus['sentence_ends'], dtype=np.uint32)
+    starts, lengths = length_stats.sentence_lengths(corpus['word_count'], sentence_ends)
+    book_starts = corpus['book_starts']
+    book_names = corpus['book_names']
+    histograms = {}
+    for start, length in zip(starts.tolist(), lengths.tolist()):
+        histograms.setdefault(book_names[bisect_right(book_starts, start) - 1], Counter())[length] += 1
+    return histograms
+
+def analyze_corpus(corpus):
+    # The same statistics as analyze_odyssey_text, computed from the stored
+    # token stream instead of the text
+    vocabulary = corpus['vocabulary']
+    total = new_text_counts()
+    total.update(corpus['counts'])
+    total['entities'] = {kind: {name: [] for name in names} for kind, names in ENTITY_GROUPS.items()}
+
+    patterns = compile_token_patterns(corpus)
+    per_book = {}
+    book_word_freqs = {}
+    word_lengths = {}
+    for label, start, end in corpus_sections(corpus):
+        section = {
+            'word_freq': word_frequencies(corpus, start, end),
+            'entities': find_entities(corpus, start, end, patterns),
+        }
+        if label is not None:
+            per_book[label] = summarize_book_counts(section)
+            book_word_freqs.setdefault(label, Counter()).update(section['word_freq'])
+        histogram = word_lengths.setdefault(label, Counter())
+        for word, count in section['word_freq'].items():
+            histogram[len(word)] += count
+        total['word_freq'].update(section['word_freq'])
+        for kind, mentions in section['entities'].items():
+            for name, positions in mentions.items():
+                total['entities'][kind][name].extend(positions)
+
+    total['word_length_total'] = sum(len(word) * count for word, count in total['word_freq'].items())
+    stats = summarize_text_counts(total)
+    stats['per_book'] = per_book
+    stats['mention_timeline'] = mention_timeline(total['entities'], list(per_book), stats['total_words'])
+
+    token_stats = {}
+    if np is not None and corpus['word_count']:
+        ids, paragraphs = token_arrays(corpus)
+        token_stats = ngram_stats.ngram_statistics(ids, paragraphs, vocabulary, STOP_WORDS)
+        token_stats.update(length_stats.length_statistics(word_lengths, sentence_length_histograms(corpus),
+                                                          list(book_word_freqs)))
+        token_stats.update(keyness_stats.book_keyness(book_word_freqs, vocabulary, STOP_WORDS))
+    return add_token_stats(stats, token_stats)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store the text as a memory-mapped token-ID stream and analyze it")
+    parser.add_argument('--text', default=DEFAULT_TEXT_FILE)
+    parser.add_argument('--corpus-file', default=DEFAULT_CORPUS_FILE)
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the corpus even if it is current")
+    parser.add_argument('--stats', metavar='FILE', help="compute the statistics from the corpus into FILE")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corpus = load_or_build_corpus(args.text, args.corpus_file, rebuild=args.rebuild)
+    opened = time.perf_counter() - start
+
+    size = os.path.getsize(args.corpus_file)
+    words = corpus['word_count']
+    print(f"{words:,} words, {len(corpus['vocabulary']):,} distinct, {len(corpus['book_names'])} book(s); "
+          f"{size / max(words, 1):.1f} bytes per word on disk; opened in {opened * 1000:.1f} ms")
+
+    if args.stats:
+        start = time.perf_counter()
+        stats = analyze_corpus(corpus)
+        save_stats_to_json(stats, args.stats)
+        print(f"Statistics computed from the corpus in {time.perf_counter() - start:.2f}s -> {args.stats}")
+
+    close_corpus(corpus)